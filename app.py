@@ -60,14 +60,54 @@ from fastapi import FastAPI, HTTPException, Request, status
 from fastapi.responses import JSONResponse,FileResponse
 from pydantic import BaseModel
 from fastapi.middleware.cors import CORSMiddleware
-from main import TechNewsAggregator, SubscriberManager
+from main import TechNewsAggregator, configure_logging
+from bulk_subscribers import BULK_FORMATS
 from fastapi import FastAPI, HTTPException, Request, status, Depends
-from fastapi.responses import JSONResponse, HTMLResponse, RedirectResponse
+from fastapi.responses import JSONResponse, HTMLResponse, RedirectResponse, StreamingResponse
 from pydantic import BaseModel
 from typing import List, Optional
+from contextlib import asynccontextmanager
+import asyncio
+import hmac
+import io
 import os
 import logging
-app = FastAPI()
+import tempfile
+
+# Run the scheduled sends in this API process as well. Off by default: the outbox does not lease rows, so
+# with several workers or replicas, every process would send the same queued digests. Enable it on
+# exactly one process, or run the scheduler separately with `python main.py`.
+RUN_SCHEDULER = os.getenv('RUN_SCHEDULER', 'false').lower() == 'true'
+# Acknowledge signups once they are in the in-memory write buffer instead of after the store commit
+SUBSCRIBE_WRITE_BUFFER = os.getenv('SUBSCRIBE_WRITE_BUFFER', 'true').lower() != 'false'
+# Bearer token for the bulk subscriber endpoints; they are disabled while it is unset
+ADMIN_API_TOKEN = os.getenv('ADMIN_API_TOKEN')
+# Import uploads are spooled in memory up to this many bytes, then to a temporary file
+BULK_SPOOL_SIZE = 8 * 1024 * 1024
+BULK_MEDIA_TYPES = {'csv': 'text/csv', 'ndjson': 'application/x-ndjson'}
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Run the newsletter scheduler alongside the API so one process serves both."""
+    configure_logging()
+    aggregator = get_aggregator()
+    await aggregator.initialize_session()
+    if RUN_SCHEDULER:
+        app.state.scheduler = asyncio.create_task(aggregator.start())
+    try:
+        yield
+    finally:
+        scheduler = getattr(app.state, 'scheduler', None)
+        if scheduler:
+            scheduler.cancel()
+            await asyncio.gather(scheduler, return_exceptions=True)
+        # Persist signups that were acknowledged but not yet committed
+        await aggregator.signup_buffer.close()
+        await aggregator.close_session()
+
+
+app = FastAPI(lifespan=lifespan)
 
 # CORS Middleware setup
 app.add_middleware(
@@ -81,16 +121,42 @@ app.add_middleware(
 
 app.secret_key = os.urandom(24)
 
-aggregator = TechNewsAggregator()
+_aggregator: Optional[TechNewsAggregator] = None
+
+
+def get_aggregator() -> TechNewsAggregator:
+    """Build the aggregator on first use so importing the app opens no files or stores."""
+    global _aggregator
+    if _aggregator is None:
+        _aggregator = TechNewsAggregator()
+    return _aggregator
 
 
 class SubscriptionRequest(BaseModel):
     email: str
-    preferences: list = []
+    preferences: List[str] = []
+    timezone: Optional[str] = None  # IANA name, e.g. "Europe/Berlin"
+    delivery_hour: Optional[int] = None  # local hour, 0-23
 
 @app.get("/")
 async def index():
     return {"message": "API! 200 OK"}
+
+@app.get("/health")
+async def health():
+    return JSONResponse(content=get_aggregator().health_status(), status_code=status.HTTP_200_OK)
+
+
+@app.get("/ready")
+async def ready():
+    checks = get_aggregator().readiness()
+    scheduler = getattr(app.state, 'scheduler', None)
+    if RUN_SCHEDULER:
+        checks["SCHEDULER"] = scheduler is not None and not scheduler.done()
+    ready_status = status.HTTP_200_OK if all(checks.values()) else status.HTTP_503_SERVICE_UNAVAILABLE
+    return JSONResponse(content=checks, status_code=ready_status)
+
+
 @app.get("/favicon.ico")
 async def favicon():
     return FileResponse(os.path.join("static", "favicon.ico"))
@@ -104,7 +170,10 @@ async def subscribe(subscription: SubscriptionRequest):
         if not email:
             raise HTTPException(status_code=400, detail="Email is required!")
 
-        aggregator.add_subscriber(email, preferences)
+        if SUBSCRIBE_WRITE_BUFFER:
+            get_aggregator().queue_subscriber(email, preferences, subscription.timezone, subscription.delivery_hour)
+        else:
+            get_aggregator().add_subscriber(email, preferences, subscription.timezone, subscription.delivery_hour)
         return JSONResponse(content={"message": "Successfully subscribed!"}, status_code=status.HTTP_200_OK)
 
     except Exception as e:
@@ -127,11 +196,10 @@ async def subscribe(subscription: SubscriptionRequest):
 @app.get("/unsubscribe")
 async def unsubscribe_page(token: str):
     try:
-        subscriber_manager = SubscriberManager()
-
         logging.info(f"Received token: {token[:10]}...")
 
-        payload = subscriber_manager.verify_token(token)
+        # The aggregator's manager keeps the verified-token cache shared across requests
+        payload = get_aggregator().subscriber_manager.verify_token(token)
         if payload['action'] != 'unsubscribe':
             raise HTTPException(status_code=400, detail="Invalid token type")
 
@@ -172,11 +240,11 @@ async def unsubscribe_confirm(request: Request):
     token = form_data.get('token')
 
     try:
-        payload = aggregator.subscriber_manager.verify_token(token)
+        payload = get_aggregator().subscriber_manager.verify_token(token)
         if payload['action'] != 'unsubscribe':
             raise HTTPException(status_code=400, detail="Invalid token type")
 
-        aggregator.remove_subscriber(payload['email'])
+        get_aggregator().remove_subscriber(payload['email'])
 
         return HTMLResponse(content="""
             <html>
@@ -204,12 +272,12 @@ async def unsubscribe_confirm(request: Request):
 @app.get("/preferences")
 async def preferences_page(token: str):
     try:
-        payload = aggregator.subscriber_manager.verify_token(token)
+        payload = get_aggregator().subscriber_manager.verify_token(token)
         if payload['action'] != 'preferences':
             raise HTTPException(status_code=400, detail="Invalid token type")
 
         email = payload['email']
-        current_preferences = aggregator.subscribers.get(email, [])
+        current_preferences = get_aggregator().subscribers.get(email, [])
 
         sources_html = ""
         for source in [
@@ -266,14 +334,19 @@ async def update_preferences(request: Request):
     new_preferences = form_data.getlist('preferences')
 
     try:
-        payload = aggregator.subscriber_manager.verify_token(token)
+        payload = get_aggregator().subscriber_manager.verify_token(token)
         if payload['action'] != 'preferences':
             raise HTTPException(status_code=400, detail="Invalid token type")
 
         email = payload['email']
-        if email in aggregator.subscribers:
-            aggregator.subscribers[email] = new_preferences
-            aggregator.save_subscribers()
+        signup_buffer = get_aggregator().signup_buffer
+        pending = signup_buffer.has_pending(email)
+        if pending or email in get_aggregator().subscribers:
+            if pending:
+                # Queue behind the buffered signup so its commit cannot overwrite these preferences
+                signup_buffer.submit(email, new_preferences)
+            else:
+                get_aggregator().subscribers[email] = new_preferences
 
             return HTMLResponse(content="""
                 <html>
@@ -297,6 +370,57 @@ async def update_preferences(request: Request):
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
+def require_admin(request: Request):
+    """Allow a request only if it carries ``Authorization: Bearer <ADMIN_API_TOKEN>``."""
+    if not ADMIN_API_TOKEN:
+        raise HTTPException(status_code=403, detail="Bulk endpoints are disabled")
+    scheme, _, token = request.headers.get('Authorization', '').partition(' ')
+    if scheme.lower() != 'bearer' or not hmac.compare_digest(token.encode(), ADMIN_API_TOKEN.encode()):
+        raise HTTPException(status_code=401, detail="Invalid admin token")
+
+
+def require_bulk_format(format: str) -> str:
+    if format not in BULK_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Format must be one of: {', '.join(BULK_FORMATS)}")
+    return format
+
+
+@app.post("/subscribers/import", dependencies=[Depends(require_admin)])
+async def import_subscribers(request: Request, format: str = 'csv'):
+    """
+    Upsert subscribers from a CSV or NDJSON request body in chunks and return a report with per-row errors.
+    The body is spooled (to disk past BULK_SPOOL_SIZE) and imported in a worker thread.
+    """
+    fmt = require_bulk_format(format)
+    aggregator = get_aggregator()
+    # Commit buffered signups first so they cannot overwrite newer imported rows later
+    await aggregator.signup_buffer.flush()
+
+    with tempfile.SpooledTemporaryFile(max_size=BULK_SPOOL_SIZE) as spool:
+        async for chunk in request.stream():
+            spool.write(chunk)
+        spool.seek(0)
+        lines = io.TextIOWrapper(spool, encoding='utf-8-sig', newline='')
+        try:
+            report = await asyncio.to_thread(aggregator.import_subscribers, lines, fmt)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        finally:
+            lines.detach()
+    return JSONResponse(content=report, status_code=status.HTTP_200_OK)
+
+
+@app.get("/subscribers/export", dependencies=[Depends(require_admin)])
+async def export_subscribers(format: str = 'csv'):
+    """Stream every subscriber as CSV or NDJSON, reading the store a page at a time."""
+    fmt = require_bulk_format(format)
+    return StreamingResponse(
+        get_aggregator().export_subscribers(fmt),
+        media_type=BULK_MEDIA_TYPES[fmt],
+        headers={'Content-Disposition': f'attachment; filename="subscribers.{fmt}"'}
+    )
+
+
 if __name__ == '__main__':
     import uvicorn
     uvicorn.run(app, host="127.0.0.1", port=5000)
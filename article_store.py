@@ -0,0 +1,160 @@
+import hashlib
+import logging
+import math
+import os
+import sqlite3
+import time
+from datetime import date, timedelta
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from dedup import article_url_key
+
+logger = logging.getLogger(__name__)
+
+ARTICLE_DB = os.getenv('ARTICLE_DB', 'articles.db')
+# Days an article sent to a preference group is held back from that group
+SEEN_WINDOW_DAYS = int(os.getenv('SEEN_WINDOW_DAYS', '7'))
+# Articles one group is expected to be sent per day; each day's filter is sized for this many
+SEEN_DAILY_CAPACITY = int(os.getenv('SEEN_DAILY_CAPACITY', '1000'))
+# Chance a never-sent article is wrongly skipped, per day in the window, while within capacity
+SEEN_FALSE_POSITIVE_RATE = 0.001
+# Archived articles not sent to anyone for this many days are pruned
+ARTICLE_RETENTION_DAYS = int(os.getenv('ARTICLE_RETENTION_DAYS', '30'))
+
+
+class BloomFilter:
+    """Fixed-size Bloom filter over strings, stored as raw bytes."""
+
+    def __init__(self, capacity: int = SEEN_DAILY_CAPACITY, error_rate: float = SEEN_FALSE_POSITIVE_RATE,
+                 data: Optional[bytes] = None):
+        size = max(8, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.size = (size + 7) // 8 * 8
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray(data) if data and len(data) * 8 == self.size else bytearray(self.size // 8)
+
+    def _positions(self, key: str) -> Iterable[int]:
+        # Double hashing: k positions from two 64-bit halves of one digest
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        first, second = int.from_bytes(digest[:8], 'little'), int.from_bytes(digest[8:], 'little') | 1
+        return ((first + i * second) % self.size for i in range(self.hashes))
+
+    def add(self, key: str):
+        for position in self._positions(key):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, key: str) -> bool:
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(key))
+
+    def to_bytes(self) -> bytes:
+        return bytes(self.bits)
+
+
+def article_key(article: Dict) -> str:
+    """Archive key of an article: its canonical URL, or its title when it has no URL."""
+    return article_url_key(article) or f"title:{(article.get('title') or '').strip().lower()}"
+
+
+class ArticleArchive:
+    """
+    Local archive of delivered articles keyed by canonical URL, plus a rolling seen-set per preference group.
+    Each group has one Bloom filter per day, so holding back what a group got in the last ``window_days``
+    costs a few KB per group and day however long the subscriber list is; filters older than the window
+    are dropped. Only days before the current run are consulted, which keeps the digest of a restarted
+    run, or of a later wave on the same day, identical to the first.
+    """
+
+    def __init__(self, path: str = ARTICLE_DB, window_days: int = SEEN_WINDOW_DAYS,
+                 capacity: int = SEEN_DAILY_CAPACITY, error_rate: float = SEEN_FALSE_POSITIVE_RATE,
+                 retention_days: int = ARTICLE_RETENTION_DAYS):
+        self.path = path
+        self.window_days = window_days
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.retention_days = retention_days
+        self.conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        with self.conn:
+            self.conn.execute('''
+                CREATE TABLE IF NOT EXISTS articles (
+                    url_key TEXT PRIMARY KEY,
+                    url TEXT,
+                    title TEXT,
+                    source TEXT,
+                    first_sent REAL NOT NULL,
+                    last_sent REAL NOT NULL,
+                    times_sent INTEGER NOT NULL DEFAULT 0
+                )
+            ''')
+            self.conn.execute('''
+                CREATE TABLE IF NOT EXISTS seen_sets (
+                    group_key TEXT NOT NULL,
+                    day TEXT NOT NULL,
+                    bits BLOB NOT NULL,
+                    PRIMARY KEY (group_key, day)
+                )
+            ''')
+            self.conn.execute('CREATE INDEX IF NOT EXISTS seen_sets_day ON seen_sets (day)')
+
+    @staticmethod
+    def group_key(fingerprint: Tuple[str, ...]) -> str:
+        """Short stable key for a preference fingerprint."""
+        return hashlib.blake2b('\x1f'.join(fingerprint).encode(), digest_size=8).hexdigest()
+
+    def _filters(self, group_key: str, day: str) -> List[BloomFilter]:
+        since = (date.fromisoformat(day) - timedelta(days=self.window_days)).isoformat()
+        rows = self.conn.execute('SELECT bits FROM seen_sets WHERE group_key = ? AND day >= ? AND day < ?',
+                                 (group_key, since, day))
+        return [BloomFilter(self.capacity, self.error_rate, bits) for (bits,) in rows]
+
+    def sent_before(self, group_key: str, day: str) -> Callable[[Dict], bool]:
+        """Return a check for whether the group got an article on any of the ``window_days`` days before ``day``
+        (YYYY-MM-DD)."""
+        filters = self._filters(group_key, day)
+        if not filters:
+            return lambda article: False
+        return lambda article: any(article_key(article) in seen for seen in filters)
+
+    def record_sent(self, group_key: str, day: str, articles: List[Dict]):
+        """Archive ``articles`` and add them to the group's seen-set for ``day``."""
+        if not articles:
+            return
+        now = time.time()
+        keys = [article_key(article) for article in articles]
+        row = self.conn.execute('SELECT bits FROM seen_sets WHERE group_key = ? AND day = ?',
+                                (group_key, day)).fetchone()
+        seen = BloomFilter(self.capacity, self.error_rate, row[0] if row else None)
+        added = [(key, article) for key, article in zip(keys, articles) if key not in seen]
+        for key, _ in added:
+            seen.add(key)
+        with self.conn:
+            self.conn.execute('INSERT OR REPLACE INTO seen_sets (group_key, day, bits) VALUES (?, ?, ?)',
+                              (group_key, day, seen.to_bytes()))
+            # Only bump counters for articles new to this group today, so re-renders of a run count once
+            self.conn.executemany(
+                'INSERT INTO articles (url_key, url, title, source, first_sent, last_sent, times_sent) '
+                'VALUES (?, ?, ?, ?, ?, ?, 1) ON CONFLICT(url_key) DO UPDATE SET '
+                'last_sent = excluded.last_sent, times_sent = times_sent + 1',
+                ((key, article.get('url'), article.get('title'), article.get('source'), now, now)
+                 for key, article in added)
+            )
+
+    def prune(self, day: str):
+        """Drop seen-sets that fell out of the window and articles not sent within the retention period."""
+        cutoff = (date.fromisoformat(day) - timedelta(days=self.window_days)).isoformat()
+        with self.conn:
+            seen_sets = self.conn.execute('DELETE FROM seen_sets WHERE day < ?', (cutoff,)).rowcount
+            articles = self.conn.execute('DELETE FROM articles WHERE last_sent < ?',
+                                         (time.time() - self.retention_days * 86400,)).rowcount
+        if seen_sets or articles:
+            logger.info(f"Pruned {seen_sets} expired seen-sets and {articles} archived articles")
+
+    def stats(self) -> Dict[str, int]:
+        """Count archived articles and stored seen-sets."""
+        (articles,) = self.conn.execute('SELECT COUNT(*) FROM articles').fetchone()
+        (seen_sets,) = self.conn.execute('SELECT COUNT(*) FROM seen_sets').fetchone()
+        return {'articles': articles, 'seen_sets': seen_sets}
+
+    def close(self):
+        """Close the archive's database connection."""
+        self.conn.close()
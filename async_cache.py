@@ -0,0 +1,107 @@
+import asyncio
+import functools
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncTTLCache:
+    """
+    TTL cache for coroutine functions that stores awaited results rather than coroutine objects.
+    Concurrent callers for the same key share one in-flight fetch, and entries are evicted
+    least-recently-used once ``maxsize`` is reached.
+    """
+
+    def __init__(self, maxsize: int = 100, ttl: float = 3600, ttls: Optional[Dict[str, float]] = None,
+                 should_cache: Callable[[Any], bool] = bool):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.ttls = dict(ttls or {})
+        self.should_cache = should_cache
+        self._entries: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+
+    def ttl_for(self, source: str) -> float:
+        """Return the TTL in seconds configured for a source."""
+        return self.ttls.get(source, self.ttl)
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Return a fresh cached value without touching the hit/miss counters."""
+        entry = self._entries.get(key)
+        if entry is None or entry[0] <= time.monotonic():
+            return default
+        return entry[1]
+
+    def set(self, key: Hashable, value: Any, ttl: float):
+        """Store a value for ``ttl`` seconds, evicting expired and then least-recently-used entries."""
+        self._entries[key] = (time.monotonic() + ttl, value)
+        self._entries.move_to_end(key)
+        if len(self._entries) > self.maxsize:
+            now = time.monotonic()
+            for stale_key in [k for k, (expires, _) in self._entries.items() if expires <= now]:
+                del self._entries[stale_key]
+                self.evictions += 1
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    async def get_or_fetch(self, key: Hashable, ttl: float, fetch: Callable[[], Any]) -> Any:
+        """Return the cached value for ``key`` or await ``fetch()`` once for all concurrent callers."""
+        entry = self._entries.get(key)
+        if entry is not None:
+            if entry[0] > time.monotonic():
+                self.hits += 1
+                self._entries.move_to_end(key)
+                return entry[1]
+            del self._entries[key]
+
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            self.coalesced += 1
+            return await asyncio.shield(inflight)
+
+        self.misses += 1
+        task = asyncio.ensure_future(fetch())
+        self._inflight[key] = task
+
+        def _store(done: asyncio.Future):
+            self._inflight.pop(key, None)
+            if done.cancelled() or done.exception() is not None:
+                return
+            if self.should_cache(done.result()):
+                self.set(key, done.result(), ttl)
+
+        task.add_done_callback(_store)
+        return await asyncio.shield(task)
+
+    def cached(self, source: str):
+        """Decorate a fetcher method so its results are cached under ``source``'s TTL."""
+
+        def decorator(func):
+            @functools.wraps(func)
+            async def wrapper(instance, *args, **kwargs):
+                key = (source, func.__qualname__, args, tuple(sorted(kwargs.items())))
+                return await self.get_or_fetch(key, self.ttl_for(source),
+                                               lambda: func(instance, *args, **kwargs))
+
+            return wrapper
+
+        return decorator
+
+    def stats(self) -> Dict[str, int]:
+        """Return hit/miss counters and the current size of the cache."""
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'coalesced': self.coalesced,
+            'evictions': self.evictions,
+            'size': len(self._entries),
+            'inflight': len(self._inflight)
+        }
@@ -0,0 +1,224 @@
+import argparse
+import contextlib
+import csv
+import io
+import json
+import logging
+import os
+import sys
+from collections.abc import MutableMapping
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+BULK_FORMATS = ('csv', 'ndjson')
+CSV_FIELDS = ('email', 'preferences', 'timezone', 'delivery_hour')
+# Preferences share one CSV column, separated by this character
+PREFERENCE_SEPARATOR = ';'
+# Rows validated and upserted per transaction during a bulk import
+BULK_CHUNK_SIZE = int(os.getenv('BULK_CHUNK_SIZE', '1000'))
+# Row errors listed in an import report; later failures are only counted
+BULK_MAX_ERRORS = int(os.getenv('BULK_MAX_ERRORS', '1000'))
+EXPORT_BATCH_SIZE = 1000
+
+Record = Tuple[str, Optional[List[str]], Optional[str], Optional[int]]
+
+
+def detect_format(path: str, default: str = 'csv') -> str:
+    """Guess the bulk format from a file name, e.g. ``subscribers.ndjson``."""
+    extension = os.path.splitext(path)[1].lower().lstrip('.')
+    if extension in ('ndjson', 'jsonl'):
+        return 'ndjson'
+    return 'csv' if extension == 'csv' else default
+
+
+def iter_rows(lines: Iterable[str], fmt: str) -> Iterator[Tuple[int, Any]]:
+    """
+    Yield ``(row number, raw record)`` for each data row, or ``(row number, exception)`` when a row cannot
+    be parsed. CSV needs a header naming at least the ``email`` column.
+    """
+    if fmt == 'csv':
+        reader = csv.DictReader(lines)
+        if not reader.fieldnames or 'email' not in reader.fieldnames:
+            raise ValueError("CSV header must include an 'email' column")
+        for row in reader:
+            yield reader.line_num, row
+    elif fmt == 'ndjson':
+        for line_number, line in enumerate(lines, start=1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError as e:
+                yield line_number, ValueError(f"Invalid JSON: {e}")
+                continue
+            yield line_number, record if isinstance(record, dict) else ValueError("Expected a JSON object")
+    else:
+        raise ValueError(f"Unsupported format: {fmt}")
+
+
+def parse_record(record: Dict[str, Any]) -> Record:
+    """Normalize a CSV or NDJSON record; blank fields mean the same defaults as a /subscribe call."""
+    email = (record.get('email') or '').strip()
+    if not email:
+        raise ValueError("Email is required")
+
+    preferences = record.get('preferences')
+    if isinstance(preferences, str):
+        preferences = [name.strip() for name in preferences.split(PREFERENCE_SEPARATOR) if name.strip()]
+    elif preferences is not None and (not isinstance(preferences, list)
+                                      or not all(isinstance(name, str) for name in preferences)):
+        # Caught per row here; a non-string name reaching the store would fail the whole chunk
+        raise ValueError("Preferences must be a list of source names")
+
+    timezone = (record.get('timezone') or '').strip() or None
+
+    delivery_hour = record.get('delivery_hour')
+    if delivery_hour in (None, ''):
+        delivery_hour = None
+    else:
+        try:
+            delivery_hour = int(delivery_hour)
+        except (TypeError, ValueError):
+            raise ValueError(f"Invalid delivery hour: {delivery_hour}")
+
+    return email, preferences or None, timezone, delivery_hour
+
+
+def bulk_import(store: MutableMapping, lines: Iterable[str], fmt: str,
+                prepare: Callable[..., List[str]], chunk_size: int = BULK_CHUNK_SIZE,
+                max_errors: int = BULK_MAX_ERRORS) -> Dict[str, Any]:
+    """
+    Validate rows with ``prepare`` and upsert them ``chunk_size`` at a time, reading ``lines`` lazily.
+    Bad rows are reported and skipped without aborting the import; if a chunk fails to commit, its rows
+    are reported as failed and the import carries on with the next chunk. Rows repeating an email within
+    a chunk coalesce, last one wins.
+    """
+    report = {'imported': 0, 'failed': 0, 'chunks': 0, 'errors': []}
+
+    def fail(row_number: int, email: Optional[str], error: Exception):
+        report['failed'] += 1
+        if len(report['errors']) < max_errors:
+            report['errors'].append({'row': row_number, 'email': email, 'error': str(error)})
+
+    preferences: Dict[str, List[str]] = {}
+    delivery: Dict[str, Tuple[str, Optional[int]]] = {}
+    rows: Dict[str, int] = {}
+
+    def commit():
+        try:
+            if hasattr(store, 'upsert_many'):
+                store.upsert_many(preferences, delivery)
+            else:
+                store.update(preferences)
+        except Exception as e:
+            logger.error(f"Error committing bulk import chunk of {len(preferences)} subscribers: {e}")
+            for email, row_number in rows.items():
+                fail(row_number, email, e)
+        else:
+            report['imported'] += len(preferences)
+        report['chunks'] += 1
+        preferences.clear()
+        delivery.clear()
+        rows.clear()
+
+    for row_number, record in iter_rows(lines, fmt):
+        email = record.get('email') if isinstance(record, dict) else None
+        try:
+            if isinstance(record, Exception):
+                raise record
+            email, row_preferences, timezone, delivery_hour = parse_record(record)
+            preferences[email] = prepare(email, row_preferences, timezone, delivery_hour)
+        except Exception as e:
+            fail(row_number, email, e)
+            continue
+
+        if timezone or delivery_hour is not None:
+            delivery[email] = (timezone or '', delivery_hour)
+        else:
+            delivery.pop(email, None)
+        rows[email] = row_number
+        if len(preferences) >= chunk_size:
+            commit()
+
+    if preferences:
+        commit()
+    logger.info(f"Bulk import finished: {report['imported']} imported, {report['failed']} failed")
+    return report
+
+
+def iter_records(store: MutableMapping, batch_size: int = EXPORT_BATCH_SIZE) -> Iterator[List[Record]]:
+    """Page through the store as ``(email, preferences, timezone, delivery hour)`` batches."""
+    if hasattr(store, 'iter_records'):
+        yield from store.iter_records(batch_size)
+    else:
+        for batch in store.iter_batches(batch_size):
+            yield [(email, preferences, '', None) for email, preferences in batch]
+
+
+def bulk_export(store: MutableMapping, fmt: str, batch_size: int = EXPORT_BATCH_SIZE) -> Iterator[str]:
+    """Stream the store in ``fmt``, one text chunk per page, so memory use does not grow with the list."""
+    if fmt not in BULK_FORMATS:
+        raise ValueError(f"Unsupported format: {fmt}")
+    if fmt == 'csv':
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(CSV_FIELDS)
+        yield buffer.getvalue()
+
+    for batch in iter_records(store, batch_size):
+        if fmt == 'csv':
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            writer.writerows(
+                (email, PREFERENCE_SEPARATOR.join(preferences), timezone,
+                 '' if delivery_hour is None else delivery_hour)
+                for email, preferences, timezone, delivery_hour in batch
+            )
+            yield buffer.getvalue()
+        else:
+            yield ''.join(
+                json.dumps({'email': email, 'preferences': preferences, 'timezone': timezone or None,
+                            'delivery_hour': delivery_hour}, ensure_ascii=False) + '\n'
+                for email, preferences, timezone, delivery_hour in batch
+            )
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Bulk import or export subscribers')
+    parser.add_argument('action', choices=['import', 'export'])
+    parser.add_argument('path', nargs='?', default='-', help="File to read or write; '-' for stdin/stdout")
+    parser.add_argument('--format', choices=BULK_FORMATS, help='Defaults to the file extension, else csv')
+    parser.add_argument('--chunk-size', type=int, default=BULK_CHUNK_SIZE)
+    args = parser.parse_args()
+
+    from main import TechNewsAggregator, configure_logging
+
+    configure_logging()
+    fmt = args.format or detect_format(args.path)
+    aggregator = TechNewsAggregator()
+    try:
+        if args.action == 'import':
+            if args.path == '-':
+                source = contextlib.nullcontext(sys.stdin)
+            else:
+                source = open(args.path, 'r', encoding='utf-8-sig', newline='')
+            with source as lines:
+                report = aggregator.import_subscribers(lines, fmt, args.chunk_size)
+            print(json.dumps(report, indent=2))
+            if report['failed']:
+                sys.exit(1)
+        else:
+            if args.path == '-':
+                target = contextlib.nullcontext(sys.stdout)
+            else:
+                target = open(args.path, 'w', encoding='utf-8', newline='')
+            with target as output:
+                for chunk in aggregator.export_subscribers(fmt):
+                    output.write(chunk)
+    finally:
+        aggregator.subscribers.close()
+
+
+if __name__ == "__main__":
+    main()
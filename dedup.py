@@ -0,0 +1,168 @@
+import hashlib
+import logging
+import os
+import re
+import struct
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Dict, FrozenSet, Iterable, List, Tuple
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+logger = logging.getLogger(__name__)
+
+# Query parameters that only track the click and never change what the page shows
+TRACKING_PARAMS = {
+    'fbclid', 'gclid', 'dclid', 'msclkid', 'mc_cid', 'mc_eid', 'igshid', 'ref', 'ref_src', 'ref_url',
+    'cmpid', 'ncid', 'ocid', 'sr_share', '_hsenc', '_hsmi', 'guccounter', 'smid'
+}
+TRACKING_PREFIXES = ('utm_', 'pk_', 'mtm_', 'hmb_')
+# Hosts whose links are discussion pages; articles from them dedupe on their ``target_url`` when known
+PERMALINK_HOSTS = {'reddit.com', 'old.reddit.com', 'news.ycombinator.com'}
+
+# Titles whose word-set Jaccard similarity reaches this are treated as the same story
+DEDUP_TITLE_THRESHOLD = float(os.getenv('DEDUP_TITLE_THRESHOLD', '0.6'))
+# MinHash signature length and its LSH split; 8 bands of 4 rows catch pairs from roughly 0.6 similarity up
+MINHASH_PERMUTATIONS = 32
+LSH_BANDS = 8
+SIGNATURE_CACHE_SIZE = 10000
+
+STOPWORDS = frozenset(
+    'a an and are as at be by for from has have how in is it its of on or that the this to was what when '
+    'why with you your will can new now'.split()
+)
+# Each token's 32 hash functions are consecutive 32-bit slices of two BLAKE2b digests
+_TOKEN_HASHES = struct.Struct(f'<{MINHASH_PERMUTATIONS}I')
+
+
+@lru_cache(maxsize=SIGNATURE_CACHE_SIZE)
+def canonicalize_url(url: str) -> str:
+    """
+    Reduce a URL to a stable key: lowercase https host without ``www.`` or default port, no fragment,
+    no tracking parameters, remaining query sorted and no trailing slash.
+    """
+    try:
+        parts = urlsplit(url.strip())
+    except ValueError:
+        return url
+    host = (parts.hostname or '').lower()
+    if host.startswith('www.'):
+        host = host[4:]
+    if parts.port and parts.port not in (80, 443):
+        host = f"{host}:{parts.port}"
+    query = sorted(
+        (key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True)
+        if key.lower() not in TRACKING_PARAMS and not key.lower().startswith(TRACKING_PREFIXES)
+    )
+    path = parts.path.rstrip('/') or '/'
+    scheme = 'https' if parts.scheme in ('http', 'https', '') else parts.scheme
+    return urlunsplit((scheme, host, path, urlencode(query), ''))
+
+
+def article_url_key(article: Dict) -> str:
+    """Canonical URL an article points at, following discussion permalinks to their target when known."""
+    url = article.get('url')
+    if not url:
+        return ''
+    target = article.get('target_url')
+    if target and urlsplit(canonicalize_url(url)).hostname in PERMALINK_HOSTS:
+        url = target
+    return canonicalize_url(url)
+
+
+def title_tokens(title: str) -> FrozenSet[str]:
+    """Lowercase word set of a title without stopwords, the unit of title similarity."""
+    return frozenset(word for word in re.findall(r'[a-z0-9]+', title.lower()) if word not in STOPWORDS)
+
+
+@lru_cache(maxsize=50000)
+def token_hashes(token: str) -> Tuple[int, ...]:
+    data = token.encode()
+    return _TOKEN_HASHES.unpack(hashlib.blake2b(data, digest_size=64).digest() +
+                                hashlib.blake2b(data, digest_size=64, person=b'minhash').digest())
+
+
+def minhash(tokens: Iterable[str]) -> Tuple[int, ...]:
+    """MinHash signature of a token set; matching positions estimate the sets' Jaccard similarity."""
+    rows = [token_hashes(token) for token in tokens]
+    return tuple(map(min, zip(*rows))) if rows else ()
+
+
+def jaccard(first: FrozenSet[str], second: FrozenSet[str]) -> float:
+    """Exact Jaccard similarity of two token sets."""
+    if not first or not second:
+        return 0.0
+    return len(first & second) / len(first | second)
+
+
+class ArticleDeduplicator:
+    """
+    Group articles that carry the same story from several sources.
+    Articles match when their canonical URLs are equal or their titles are near-duplicates. Title
+    candidates come from MinHash LSH buckets, so only articles sharing a band are compared and the
+    cost stays near-linear in the pool size; each candidate pair is confirmed with the exact Jaccard
+    similarity. Each article is labelled with the first article of its cluster, and choosing which
+    member to keep is left to the caller, such as the ranker keeping the best-scored one.
+    """
+
+    def __init__(self, threshold: float = DEDUP_TITLE_THRESHOLD, bands: int = LSH_BANDS,
+                 cache_size: int = SIGNATURE_CACHE_SIZE):
+        self.threshold = threshold
+        self.bands = bands
+        self.rows = MINHASH_PERMUTATIONS // bands
+        self.cache_size = cache_size
+        self.signatures: OrderedDict = OrderedDict()  # title: (tokens, signature)
+
+    def signature(self, title: str) -> Tuple[FrozenSet[str], Tuple[int, ...]]:
+        """Tokens and MinHash of a title, memoized because the same titles recur for every subscriber."""
+        cached = self.signatures.get(title)
+        if cached is not None:
+            self.signatures.move_to_end(title)
+            return cached
+        tokens = title_tokens(title)
+        cached = self.signatures[title] = (tokens, minhash(tokens))
+        if len(self.signatures) > self.cache_size:
+            self.signatures.popitem(last=False)
+        return cached
+
+    def clusters(self, articles: List[Dict]) -> List[int]:
+        """Return, for each article, the index of the first article in its duplicate cluster."""
+        parent = list(range(len(articles)))
+
+        def find(index: int) -> int:
+            while parent[index] != index:
+                parent[index] = parent[parent[index]]
+                index = parent[index]
+            return index
+
+        def union(first: int, second: int):
+            first, second = find(first), find(second)
+            if first != second:
+                parent[max(first, second)] = min(first, second)
+
+        by_url: Dict[str, int] = {}
+        buckets: Dict[Tuple[int, Tuple[int, ...]], List[int]] = {}
+        tokens: List[FrozenSet[str]] = []
+        for index, article in enumerate(articles):
+            key = article_url_key(article)
+            if key in by_url:
+                union(by_url[key], index)
+            elif key:
+                by_url[key] = index
+
+            article_tokens, signature = self.signature(article.get('title') or '')
+            tokens.append(article_tokens)
+            compared = set()
+            for band in range(self.bands if signature else 0):
+                bucket = buckets.setdefault((band, signature[band * self.rows:(band + 1) * self.rows]), [])
+                matched = False
+                for other in bucket:
+                    if other not in compared:
+                        compared.add(other)
+                        if jaccard(article_tokens, tokens[other]) >= self.threshold:
+                            union(other, index)
+                            matched = True
+                # A matched article is already represented here, which keeps buckets of repeated stories small
+                if not matched:
+                    bucket.append(index)
+
+        return [find(index) for index in range(len(articles))]
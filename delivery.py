@@ -0,0 +1,187 @@
+import asyncio
+import logging
+import os
+import smtplib
+import time
+from email.message import Message
+from typing import AsyncIterable, Callable, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Messages per second each provider tolerates before throttling or flagging the sender
+PROVIDER_RATE_LIMITS = {
+    'smtp.gmail.com': 5,
+    'smtp.office365.com': 5,
+    'localhost': 0,  # no cap for a local stand-in server
+    '127.0.0.1': 0
+}
+
+# Errors that mean the recipient or message was rejected; retrying on a fresh connection won't help
+PERMANENT_ERRORS = (smtplib.SMTPRecipientsRefused, smtplib.SMTPSenderRefused, smtplib.SMTPDataError)
+
+# Called with (recipient, error, transient) after each message; error is None on success
+ResultCallback = Callable[[str, Optional[Exception], bool], None]
+
+
+def is_transient(error: Exception) -> bool:
+    """Whether a failed send is worth retrying later (4xx replies and connection problems)."""
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return all(400 <= code < 500 for code, _ in error.recipients.values())
+    if isinstance(error, smtplib.SMTPResponseException):
+        return 400 <= error.smtp_code < 500
+    return True
+
+
+class RateLimiter:
+    """Space out acquisitions so no more than ``rate`` happen per second across all workers."""
+
+    def __init__(self, rate: float):
+        self.interval = 1 / rate if rate else 0
+        self._next = 0.0
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        if not self.interval:
+            return
+        async with self._lock:
+            now = asyncio.get_running_loop().time()
+            if self._next > now:
+                await asyncio.sleep(self._next - now)
+            self._next = max(now, self._next) + self.interval
+
+
+class SMTPDeliveryEngine:
+    """
+    Deliver messages over a pool of persistent SMTP connections running concurrently.
+    Each connection is recycled after ``messages_per_connection`` messages or on error, and sends
+    are capped at the provider's messages-per-second limit. Point it at a local stand-in such as
+    ``python -m aiosmtpd -n -l localhost:8025`` with SMTP_HOST/SMTP_PORT and SMTP_STARTTLS=false.
+    """
+
+    def __init__(self, host: str, port: int, username: Optional[str] = None, password: Optional[str] = None,
+                 pool_size: int = 4, messages_per_connection: int = 100, rate_limit: Optional[float] = None,
+                 starttls: bool = True, timeout: float = 30):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.pool_size = max(1, pool_size)
+        self.messages_per_connection = messages_per_connection
+        if rate_limit is None:
+            rate_limit = PROVIDER_RATE_LIMITS.get(host, 0)
+        self.rate_limiter = RateLimiter(rate_limit)
+        self.starttls = starttls
+        self.timeout = timeout
+
+    @classmethod
+    def from_env(cls, username: Optional[str], password: Optional[str]) -> 'SMTPDeliveryEngine':
+        """Build an engine from SMTP_* environment variables, defaulting to Gmail."""
+        rate_limit = os.getenv('SMTP_RATE_LIMIT')
+        return cls(
+            host=os.getenv('SMTP_HOST', 'smtp.gmail.com'),
+            port=int(os.getenv('SMTP_PORT', '587')),
+            username=username,
+            password=password,
+            pool_size=int(os.getenv('SMTP_POOL_SIZE', '4')),
+            messages_per_connection=int(os.getenv('SMTP_MESSAGES_PER_CONNECTION', '100')),
+            rate_limit=float(rate_limit) if rate_limit else None,
+            starttls=os.getenv('SMTP_STARTTLS', 'true').lower() != 'false'
+        )
+
+    def _connect(self) -> smtplib.SMTP:
+        server = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        if self.starttls:
+            server.starttls()
+        if self.username and self.password:
+            server.login(self.username, self.password)
+        return server
+
+    @staticmethod
+    def _close(server: smtplib.SMTP):
+        try:
+            server.quit()
+        except Exception:
+            server.close()
+
+    @staticmethod
+    def _report(on_result: Optional[ResultCallback], recipient: str, error: Optional[Exception]):
+        if on_result is None:
+            return
+        try:
+            on_result(recipient, error, error is not None and is_transient(error))
+        except Exception as e:
+            logger.error(f"Error recording delivery result for {recipient}: {e}")
+
+    async def _worker(self, queue: asyncio.Queue, stats: Dict[str, int], on_result: Optional[ResultCallback]):
+        server = None
+        sent_on_connection = 0
+        try:
+            while True:
+                item = await queue.get()
+                if item is None:
+                    break
+                recipient, message = item
+                for attempt in range(2):
+                    error = None
+                    try:
+                        await self.rate_limiter.acquire()
+                        if server is None:
+                            server = await asyncio.to_thread(self._connect)
+                            sent_on_connection = 0
+                        await asyncio.to_thread(server.send_message, message)
+                    except PERMANENT_ERRORS as e:
+                        error = e
+                    except Exception as e:
+                        # Drop the connection and retry the message once on a fresh one
+                        if server is not None:
+                            await asyncio.to_thread(self._close, server)
+                            server = None
+                        stats['reconnects'] += 1
+                        if not attempt:
+                            continue
+                        error = e
+
+                    if error is None:
+                        stats['sent'] += 1
+                        sent_on_connection += 1
+                        logger.info(f"Newsletter sent to {recipient}")
+                        if sent_on_connection >= self.messages_per_connection:
+                            await asyncio.to_thread(self._close, server)
+                            server = None
+                    else:
+                        stats['failed'] += 1
+                        logger.error(f"Error sending newsletter to {recipient}: {error}")
+                    # Reported outside the send so a failing callback never re-sends an accepted message
+                    self._report(on_result, recipient, error)
+                    break
+        finally:
+            if server is not None:
+                await asyncio.to_thread(self._close, server)
+
+    async def deliver(self, messages: AsyncIterable[Tuple[str, Message]],
+                      on_result: Optional[ResultCallback] = None) -> Dict[str, float]:
+        """
+        Send every (recipient, message) pair and return delivery stats including messages/sec.
+        ``on_result`` is told the outcome of each message so callers can keep a durable record.
+        """
+        stats = {'sent': 0, 'failed': 0, 'reconnects': 0}
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.pool_size * 2)
+        started = time.perf_counter()
+
+        workers = [asyncio.create_task(self._worker(queue, stats, on_result)) for _ in range(self.pool_size)]
+        try:
+            async for item in messages:
+                await queue.put(item)
+            for _ in workers:
+                await queue.put(None)
+            await asyncio.gather(*workers)
+        finally:
+            for worker in workers:
+                worker.cancel()
+
+        elapsed = time.perf_counter() - started
+        stats['elapsed'] = round(elapsed, 2)
+        stats['messages_per_second'] = round(stats['sent'] / elapsed, 2) if elapsed else 0.0
+        logger.info(f"Delivered {stats['sent']} messages ({stats['failed']} failed) "
+                    f"in {stats['elapsed']}s at {stats['messages_per_second']} msg/s")
+        return stats
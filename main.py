@@ -1,50 +1,310 @@
-import requests
-import smtplib
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
 from dotenv import load_dotenv
-import schedule
 import json
-import feedparser
-from flask import Flask, jsonify, make_response
-from threading import Thread
 import logging
-import aiohttp
 import asyncio
 from email.utils import formataddr
 import re
-from cachetools import cached, TTLCache
-import jwt
+import calendar
+from article_store import ArticleArchive
+from async_cache import AsyncTTLCache
+from bulk_subscribers import BULK_CHUNK_SIZE, bulk_export, bulk_import
+from dedup import ArticleDeduplicator
+from ranking import ArticleRanker
+from delivery import SMTPDeliveryEngine
+from outbox import SendLedger, SourceHealthLog
+from scheduler import DailyScheduler, HourlyScheduler, local_hours_started
+from subscriber_store import create_subscriber_store, watch_versions
+from write_buffer import SubscriberWriteBuffer
 import os
-from typing import Dict, List, Optional
-from fastapi import HTTPException
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, MutableMapping, Optional, Set, Tuple
+from collections import OrderedDict
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+import time
+import hashlib
+import hmac
+import base64
 from urllib.parse import quote
 from datetime import datetime, timedelta
 import pytz
-import io
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('tech_news.log'),
-        logging.StreamHandler()
-    ]
-)
+import tempfile
 logger = logging.getLogger(__name__)
-cache = TTLCache(maxsize=100, ttl=3600)
 
 
-SUBSCRIBERS_FILE = "subscribers.json"
+def configure_logging(log_file: str = 'tech_news.log'):
+    """Log to the console and ``log_file``; called by entry points rather than at import."""
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+        handlers=[
+            logging.FileHandler(log_file),
+            logging.StreamHandler()
+        ]
+    )
+
+
+# Per-source TTLs in seconds; fast-moving sources expire sooner
+SOURCE_TTLS = {
+    'Hacker News': 900,
+    'Reddit': 1800,
+    'Stack Exchange': 1800,
+    'NewsAPI': 1800,
+    'RSS': 1800,
+    'Dev.to': 3600,
+    'GitHub Trending': 3600,
+    'Science Daily': 3600
+}
+cache = AsyncTTLCache(maxsize=100, ttl=3600, ttls=SOURCE_TTLS)
+
+# Upper bound in seconds for a single upstream request so one slow source cannot stall a sweep
+REQUEST_TIMEOUT = float(os.getenv('FETCH_TIMEOUT', '10'))
+
+# Hacker News item loader: how many top stories to load and how many item requests may be in flight
+HN_API_URL = 'https://hacker-news.firebaseio.com/v0'
+HN_DEPTH = int(os.getenv('HN_DEPTH', '10'))
+HN_CONCURRENCY = int(os.getenv('HN_CONCURRENCY', '10'))
+# Top stories barely change between runs, so items are cached by id independently of the story list
+hn_item_cache = AsyncTTLCache(maxsize=500, ttl=600)
+
+# GitHub probes: concurrent requests in flight, quota kept in reserve, and ETag-validated bodies kept around
+GITHUB_CONCURRENCY = int(os.getenv('GITHUB_CONCURRENCY', '8'))
+GITHUB_RATE_LIMIT_RESERVE = int(os.getenv('GITHUB_RATE_LIMIT_RESERVE', '10'))
+GITHUB_ETAG_CACHE_SIZE = 256
+github_etag_cache: "OrderedDict[Tuple[str, Optional[str]], Tuple[str, Any]]" = OrderedDict()
+
+# Feed parsing is CPU-bound, so it runs in a 'thread' or 'process' pool instead of on the event loop
+FEED_PARSER_EXECUTOR = os.getenv('FEED_PARSER_EXECUTOR', 'thread')
+FEED_PARSER_WORKERS = int(os.getenv('FEED_PARSER_WORKERS', '4'))
+FEED_ENTRY_LIMIT = 5
+
+# Per-feed ETag / Last-Modified validators and last parse, shared across runs and processes
+FEED_STATE_FILE = os.getenv('FEED_STATE_FILE', 'feed_state.json')
+
+
+# Recipients read from the outbox and subscriber store per page during a send run
+SEND_PAGE_SIZE = int(os.getenv('SEND_PAGE_SIZE', '500'))
+# Seconds before NEWSLETTER_TIME to fetch sources, so delivery starts on time; 0 disables prefetching
+PREFETCH_LEAD = float(os.getenv('NEWSLETTER_PREFETCH_MINUTES', '5')) * 60
+# 'daily' sends everyone at NEWSLETTER_TIME in server-local time; 'waves' sends hourly to subscribers whose
+# preferred hour has come in their own timezone, NEWSLETTER_TIMEZONE (default UTC) for those without one
+DELIVERY_MODE = os.getenv('DELIVERY_MODE', 'daily')
+# How long one source snapshot is reused across consecutive delivery waves, in seconds
+SNAPSHOT_MAX_AGE = float(os.getenv('SNAPSHOT_MAX_AGE', '10800'))
+# Hold back articles a preference group was already sent within SEEN_WINDOW_DAYS; 'false' disables it
+SKIP_SENT_ARTICLES = os.getenv('SKIP_SENT_ARTICLES', 'true').lower() != 'false'
+
+# Management link tokens: lifetime, and how many verified tokens the API keeps decoded
+TOKEN_LIFETIME = timedelta(days=30)
+VERIFIED_TOKEN_CACHE_SIZE = int(os.getenv('VERIFIED_TOKEN_CACHE_SIZE', '1024'))
+# 'compact' (default) mints short HMAC tokens indexed by subscriber id, 'jwt' keeps full JWTs.
+# Both formats are always accepted when verifying.
+TOKEN_FORMAT = os.getenv('TOKEN_FORMAT', 'compact')
+COMPACT_TOKEN_PREFIX = 'c1'
+COMPACT_TOKEN_ACTIONS = {'unsubscribe': 'u', 'preferences': 'p'}
+COMPACT_TOKEN_CODES = {code: action for action, code in COMPACT_TOKEN_ACTIONS.items()}
+COMPACT_TOKEN_SIGNATURE_BYTES = 16  # truncated HMAC-SHA256, 128 bits
+
+# Categories a subscriber can pick instead of individual sources
+CATEGORY_MAPPING = {
+    "Programming": ["Hacker News", "Reddit", "Dev.to", "Stack Exchange", "GitHub Trending"],
+    "Tech & AI": ["The Verge", "Wired", "Ars Technica", "VentureBeat", "ZDNet", "TechRadar", "Hackernoon",
+                  "Science Daily"]
+}
+
+
+def parse_feed_entries(content: str, source_name: str, limit: int,
+                       known: Optional[Dict[str, Dict]] = None) -> Tuple[List[Dict], float]:
+    """
+    Parse a feed and return its first ``limit`` entries as articles along with the parse time.
+    Runs inside the feed executor, so only the trimmed article list crosses back to the event loop.
+    The feed is always parsed in full; entries whose id is in ``known`` only skip rebuilding their article.
+    """
+    import feedparser
+
+    started = time.perf_counter()
+    known = known or {}
+    feed = feedparser.parse(content)
+    articles = []
+    for entry in feed.entries[:limit]:
+        entry_id = entry.get('id') or entry.link
+        if entry_id in known:
+            articles.append(known[entry_id])
+            continue
+        articles.append({
+            'id': entry_id,
+            'title': entry.title,
+            'url': entry.link,
+            'description': (entry.summary[:200] + '...') if hasattr(entry,
+                                                                    'summary') else 'No description available',
+            'source': source_name,
+            'published': calendar.timegm(entry.published_parsed) if entry.get('published_parsed') else None
+        })
+    return articles, time.perf_counter() - started
+
+
+class FeedStateStore:
+    """Persist per-feed HTTP validators and the last parsed entries so unchanged feeds are not re-parsed."""
+
+    def __init__(self, path: str = FEED_STATE_FILE):
+        self.path = path
+        self.feeds: Dict[str, Dict] = {}
+        self.load()
+
+    def load(self):
+        """Load feed state from disk if it exists."""
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                self.feeds = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            self.feeds = {}
+
+    def get(self, url: str) -> Dict:
+        """Return the stored state for a feed URL."""
+        return self.feeds.get(url, {})
+
+    def update(self, url: str, **state):
+        """Replace the stored state for a feed URL and persist it."""
+        self.feeds[url] = {key: value for key, value in state.items() if value is not None}
+        self.save(url)
+
+    def save(self, url: Optional[str] = None):
+        """
+        Write feed state atomically so a crash never leaves a truncated file. When ``url`` is given, feeds other
+        processes saved since this one loaded are merged in first, so their validators are not overwritten.
+        """
+        tmp_path = None
+        try:
+            if url is not None:
+                current = self.feeds[url]
+                self.load()
+                self.feeds[url] = current
+            directory = os.path.dirname(os.path.abspath(self.path))
+            # A unique temporary name, so processes saving at once never write into the same file
+            with tempfile.NamedTemporaryFile('w', encoding='utf-8', dir=directory, prefix='.feed_state.',
+                                             suffix='.tmp', delete=False) as f:
+                tmp_path = f.name
+                f.write(json.dumps(self.feeds, ensure_ascii=False))
+            os.replace(tmp_path, self.path)
+        except Exception as e:
+            logger.error(f"Error saving feed state: {e}")
+            if tmp_path and os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+
+def create_feed_executor() -> Executor:
+    """Create the pool feed parsing runs in, as configured by FEED_PARSER_EXECUTOR and FEED_PARSER_WORKERS."""
+    if FEED_PARSER_EXECUTOR == 'process':
+        return ProcessPoolExecutor(max_workers=FEED_PARSER_WORKERS)
+    return ThreadPoolExecutor(max_workers=FEED_PARSER_WORKERS, thread_name_prefix='feed-parser')
+
+# Newsletter template pieces, formatted once per section/article instead of grown with +=
+NEWSLETTER_HEADER = """
+        <html>
+        <head>
+            <meta charset="UTF-8">
+            <meta name="viewport" content="width=device-width, initial-scale=1.0">
+            <style>
+                body { font-family: Arial, sans-serif; max-width: 650px; margin: 0 auto; padding: 20px; color: #333; }
+                .header { text-align: center; margin-bottom: 40px; }
+                .header h1 { font-size: 36px; font-weight: bold; margin: 0; }
+                .section { margin-bottom: 40px; }
+                .section-title { font-size: 24px; font-weight: bold; margin-bottom: 10px; border-bottom: 2px solid #ddd; padding-bottom: 5px; }
+                .article { margin-bottom: 20px; }
+                .article-title { font-size: 18px; font-weight: bold; color: #0073e6; text-decoration: none; }
+                .article-title:hover { text-decoration: underline; }
+                .article-description { font-size: 16px; color: #666; margin: 8px 0; }
+                .article-meta { font-size: 14px; color: #999; }
+                .footer { text-align: center; font-size: 14px; color: #777; margin-top: 40px; padding-top: 20px; border-top: 1px solid #ddd; }
+                .unsubscribe { color: red; text-decoration: none; }
+            </style>
+        </head>
+        <body>
+            <div class="header">
+                <h1>OnePaper</h1>
+                <p>Your daily dose of programming & AI news</p>
+            </div>
+        """
+SECTION_OPEN_TEMPLATE = '<div class="section"><h2 class="section-title">{source}</h2>'
+ARTICLE_TEMPLATE = """
+                    <div class="article">
+                        <a href="{url}" class="article-title">{title}</a>
+                        <p class="article-description">{description}</p>
+                        <p class="article-meta">Source: {source}</p>
+                    </div>
+                """
+SECTION_CLOSE = '</div>'
+FOOTER_TEMPLATE = """
+            <div class="footer">
+                <p>Enjoyed this newsletter? Share it with friends!</p>
+                <p><a href="{preferences}">Manage Preferences</a> | <a href="{unsubscribe}" class="unsubscribe">Unsubscribe</a></p>
+            </div>
+        </body>
+        </html>
+        """
+
+
+class GitHubRateLimitExceeded(Exception):
+    """Raised when the GitHub quota is down to the configured reserve."""
+
+
+class GitHubRateLimiter:
+    """Bound concurrent GitHub API calls and stop issuing them once X-RateLimit-Remaining hits the reserve."""
+
+    def __init__(self, concurrency: int = GITHUB_CONCURRENCY, reserve: int = GITHUB_RATE_LIMIT_RESERVE):
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.reserve = reserve
+        self.remaining: Optional[int] = None
+        self.reset_at: float = 0
+
+    async def __aenter__(self):
+        await self.semaphore.acquire()
+        if self.remaining is not None and self.remaining <= self.reserve and time.time() < self.reset_at:
+            self.semaphore.release()
+            raise GitHubRateLimitExceeded(
+                f"{self.remaining} requests left until {datetime.fromtimestamp(self.reset_at).strftime('%H:%M:%S')}")
+        if self.remaining is not None:
+            # Count the request up front so concurrent callers do not overshoot the reserve
+            self.remaining -= 1
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self.semaphore.release()
+
+    def update(self, headers):
+        """Record the quota reported by a GitHub response."""
+        try:
+            self.remaining = int(headers['X-RateLimit-Remaining'])
+            self.reset_at = float(headers.get('X-RateLimit-Reset', 0))
+        except (KeyError, TypeError, ValueError):
+            pass
+
+
+def _http_error(status_code: int, detail: str) -> Exception:
+    # FastAPI is only loaded once a token fails, which in practice means inside the API process
+    from fastapi import HTTPException
+
+    return HTTPException(status_code=status_code, detail=detail)
+
+
+def _base36(value: int) -> str:
+    digits = '0123456789abcdefghijklmnopqrstuvwxyz'
+    encoded = ''
+    while True:
+        value, remainder = divmod(value, 36)
+        encoded = digits[remainder] + encoded
+        if not value:
+            return encoded
 
 
 class SubscriberManager:
-    def __init__(self):
+    def __init__(self, index: Optional[MutableMapping] = None):
+        # Subscriber store resolving compact-token ids to emails; set once subscribers are loaded
+        self.index = index
         self.secret_key = os.getenv('JWT_SECRET_KEY')
         if not self.secret_key:
             self.secret_key = ''
 
         self.logger = logging.getLogger(__name__)
+        self.verified_tokens: "OrderedDict[str, dict]" = OrderedDict()  # token: decoded payload
 
     # def generate_token(self, email: str, action: str) -> str:
     #     """Generate a secure token for subscriber actions"""
@@ -63,44 +323,121 @@ class SubscriberManager:
     #         raise HTTPException(status_code=500, detail="Error generating token")
     def generate_token(self, email: str, action: str) -> str:
         """Generate a secure token for subscriber actions"""
+        return self.generate_tokens(email, [action])[action]
+
+    def generate_tokens(self, email: str, actions: Iterable[str],
+                        subscriber_id: Optional[int] = None) -> Dict[str, str]:
+        """
+        Generate one token per action for a subscriber, sharing a single issue time.
+        Subscribers with an id in the subscriber index get compact tokens; everyone else gets JWTs.
+        """
         try:
             utc_now = datetime.now(pytz.UTC)
-            payload = {
-                'email': email,
-                'action': action,
-                'exp': utc_now + timedelta(days=30),  # Token expires in 30 days
-                'iat': utc_now  # Token creation time
-            }
-            token = jwt.encode(payload, self.secret_key, algorithm='HS256')
-            self.logger.info(f"Generated token for {email} with action {action}")
-            return token
+            if subscriber_id is None and self.compact_tokens_enabled:
+                subscriber_id = self.index.subscriber_ids([email]).get(email)
+            if subscriber_id is not None and self.compact_tokens_enabled:
+                expires = int((utc_now + TOKEN_LIFETIME).timestamp())
+                tokens = {action: self.generate_compact_token(subscriber_id, email, action, expires)
+                          for action in actions}
+            else:
+                import jwt
+
+                tokens = {}
+                for action in actions:
+                    payload = {
+                        'email': email,
+                        'action': action,
+                        'exp': utc_now + TOKEN_LIFETIME,
+                        'iat': utc_now  # Token creation time
+                    }
+                    tokens[action] = jwt.encode(payload, self.secret_key, algorithm='HS256')
+            # Called for every recipient of a send run, so this stays out of the INFO log
+            self.logger.debug(f"Generated {', '.join(tokens)} tokens for {email}")
+            return tokens
         except Exception as e:
             self.logger.error(f"Error generating token: {e}")
-            raise HTTPException(status_code=500, detail="Error generating token")
+            raise _http_error(500, "Error generating token")
 
-    def verify_token(self, token: str) -> dict:
-        """Verify and decode a subscriber token"""
+    @property
+    def compact_tokens_enabled(self) -> bool:
+        """Compact tokens need a subscriber index that can map ids back to emails."""
+        return TOKEN_FORMAT == 'compact' and hasattr(self.index, 'subscriber_ids')
+
+    def _sign_compact(self, subscriber_id: int, email: str, action: str, expires: int) -> str:
+        # An empty key would let anyone who knows an email forge its links, so refuse like PyJWT does
+        if not self.secret_key:
+            raise ValueError("JWT_SECRET_KEY is not set")
+        # The email is signed too, so a token cannot be replayed against a reused id
+        message = f"{subscriber_id}.{action}.{expires}.{email}".encode('utf-8')
+        digest = hmac.new(self.secret_key.encode('utf-8'), message, hashlib.sha256).digest()
+        return base64.urlsafe_b64encode(digest[:COMPACT_TOKEN_SIGNATURE_BYTES]).rstrip(b'=').decode('ascii')
+
+    def generate_compact_token(self, subscriber_id: int, email: str, action: str, expires: int) -> str:
+        """Build a compact token: prefix, base36 subscriber id, action code, base36 expiry and a truncated HMAC."""
+        return '.'.join((COMPACT_TOKEN_PREFIX, _base36(subscriber_id), COMPACT_TOKEN_ACTIONS[action],
+                         _base36(expires), self._sign_compact(subscriber_id, email, action, expires)))
+
+    def _verify_compact(self, token: str) -> dict:
         try:
-            # Add logging to track token verification
-            self.logger.info("Attempting to verify token")
+            _, subscriber_id, action_code, expires, signature = token.split('.')
+            subscriber_id, expires = int(subscriber_id, 36), int(expires, 36)
+            action = COMPACT_TOKEN_CODES[action_code]
+        except (ValueError, KeyError):
+            self.logger.error("Invalid token: malformed compact token")
+            raise _http_error(400, "Invalid token")
 
-            # Decode and verify the token
-            payload = jwt.decode(token, self.secret_key, algorithms=['HS256'])
+        if not self.secret_key:
+            self.logger.error("Invalid token: JWT_SECRET_KEY is not set")
+            raise _http_error(400, "Invalid token")
+        email = self.index.email_for_id(subscriber_id) if hasattr(self.index, 'email_for_id') else None
+        if email is None or not hmac.compare_digest(
+                signature, self._sign_compact(subscriber_id, email, action, expires)):
+            self.logger.error("Invalid token: compact token signature mismatch")
+            raise _http_error(400, "Invalid token")
+        if expires <= time.time():
+            self.logger.error("Token has expired")
+            raise _http_error(400, "Token has expired")
+        return {'email': email, 'action': action, 'exp': expires}
+
+    def verify_token(self, token: str) -> dict:
+        """Verify and decode a subscriber token, reusing recently verified ones until they expire"""
+        cached = self.verified_tokens.get(token)
+        if cached is not None:
+            if cached.get('exp', 0) > time.time():
+                self.verified_tokens.move_to_end(token)
+                return dict(cached)
+            del self.verified_tokens[token]
+
+        if token.startswith(COMPACT_TOKEN_PREFIX + '.'):
+            payload = self._verify_compact(token)
+        else:
+            payload = self._verify_jwt(token)
+
+        # Only successfully verified tokens are cached, so bad tokens are always re-checked
+        self.verified_tokens[token] = dict(payload)
+        while len(self.verified_tokens) > VERIFIED_TOKEN_CACHE_SIZE:
+            self.verified_tokens.popitem(last=False)
+        return payload
 
-            # Log successful verification
-            self.logger.info(f"Token verified successfully for {payload.get('email')}")
+    def _verify_jwt(self, token: str) -> dict:
+        # PyJWT is only needed for links minted before compact tokens, or with TOKEN_FORMAT=jwt
+        import jwt
 
+        try:
+            # Decode and verify the token
+            payload = jwt.decode(token, self.secret_key, algorithms=['HS256'])
+            self.logger.debug(f"Token verified successfully for {payload.get('email')}")
             return payload
 
         except jwt.ExpiredSignatureError:
             self.logger.error("Token has expired")
-            raise HTTPException(status_code=400, detail="Token has expired")
+            raise _http_error(400, "Token has expired")
         except jwt.InvalidTokenError as e:
             self.logger.error(f"Invalid token: {str(e)}")
-            raise HTTPException(status_code=400, detail="Invalid token")
+            raise _http_error(400, "Invalid token")
         except Exception as e:
             self.logger.error(f"Unexpected error during token verification: {str(e)}")
-            raise HTTPException(status_code=400, detail="Invalid token")
+            raise _http_error(400, "Invalid token")
 
 class TechNewsAggregator:
     def __init__(self):
@@ -108,7 +445,7 @@ class TechNewsAggregator:
         self.subscriber_manager = SubscriberManager()
         self.base_url = os.getenv('BASE_URL', 'http://localhost:5000')
         load_dotenv()
-        self.subscribers = {}  # email: [preferences]
+        self.subscribers: MutableMapping = {}  # email: [preferences], backed by the subscriber store
         self.email_sender = os.getenv('EMAIL_SENDER')
         self.email_password = os.getenv('EMAIL_PASSWORD')
         self.sender_name = os.getenv('SENDER_NAME', 'Tech News Digest')
@@ -117,40 +454,125 @@ class TechNewsAggregator:
             'github': os.getenv('GITHUB_TOKEN')
         }
         self.load_subscribers()
-        self.flask_app = Flask(__name__)
-        self.add_health_endpoint()
         self.session = None
-
-    def get_management_links(self, email: str) -> Dict[str, str]:
+        self.hn_semaphore = asyncio.BoundedSemaphore(HN_CONCURRENCY)
+        self.github_limiter = GitHubRateLimiter()
+        self.feed_executor: Optional[Executor] = None
+        self.parse_metrics: Dict[str, Dict[str, float]] = {}  # source: parse timings
+        self.feed_state = FeedStateStore()
+        self.last_delivery_stats: Dict[str, float] = {}
+        self.source_order: Optional[Dict[str, int]] = None
+        self.cached_subscribed_sources: Set[str] = set()
+        self.subscribed_sources_version: Any = None
+        self.subscriber_watcher: Optional[asyncio.Task] = None
+        self.source_health: Optional[SourceHealthLog] = None  # shared with other processes through the outbox db
+        self.last_send_run: Dict[str, Any] = {}
+        self.send_locks: Dict[str, asyncio.Lock] = {}  # run date: lock held while that run sends
+        self.resume_task: Optional[asyncio.Task] = None
+        self.scheduler: Optional[DailyScheduler] = None
+        self.wave_snapshot: Optional[Tuple[float, Dict[str, List[Dict]]]] = None  # (taken at, snapshot)
+        self.deduplicator = ArticleDeduplicator()
+        self.ranker = ArticleRanker(self.deduplicator)
+
+    def get_management_links(self, email: str, subscriber_id: Optional[int] = None) -> Dict[str, str]:
         """Generate secure links for subscription management"""
-        unsubscribe_token = self.subscriber_manager.generate_token(email, 'unsubscribe')
-        preferences_token = self.subscriber_manager.generate_token(email, 'preferences')
+        tokens = self.subscriber_manager.generate_tokens(email, ('unsubscribe', 'preferences'), subscriber_id)
 
         return {
-            'unsubscribe': f"{self.base_url}/unsubscribe?token={quote(unsubscribe_token)}",
-            'preferences': f"{self.base_url}/preferences?token={quote(preferences_token)}"
+            'unsubscribe': f"{self.base_url}/unsubscribe?token={quote(tokens['unsubscribe'])}",
+            'preferences': f"{self.base_url}/preferences?token={quote(tokens['preferences'])}"
         }
 
+    def get_management_links_batch(self, emails: Iterable[str]) -> Dict[str, Dict[str, str]]:
+        """Generate management links for a page of recipients, minting each recipient's tokens once."""
+        started = time.perf_counter()
+        emails = list(emails)
+        # One id lookup per page instead of one per recipient
+        ids = self.subscribers.subscriber_ids(emails) if self.subscriber_manager.compact_tokens_enabled else {}
+        links = {email: self.get_management_links(email, ids.get(email)) for email in emails}
+        logger.debug(f"Minted management links for {len(links)} recipients "
+                     f"in {(time.perf_counter() - started) * 1000:.1f}ms")
+        return links
+
     async def initialize_session(self):
         """Initialize aiohttp session for async requests"""
         if not self.session:
-            self.session = aiohttp.ClientSession()
+            # aiohttp is imported here so importing this module stays cheap for the API and CLI
+            import aiohttp
+
+            self.session = aiohttp.ClientSession(
+                timeout=aiohttp.ClientTimeout(total=REQUEST_TIMEOUT),
+                connector=aiohttp.TCPConnector(limit=int(os.getenv('FETCH_CONNECTIONS', '50')), ttl_dns_cache=300)
+            )
 
     async def close_session(self):
         """Close aiohttp session"""
         if self.session:
             await self.session.close()
             self.session = None
+        if self.feed_executor:
+            self.feed_executor.shutdown(wait=False)
+            self.feed_executor = None
+        if self.source_health:
+            self.source_health.close()
+            self.source_health = None
+
+    async def fetch_feed(self, url: str, source_name: str) -> List[Dict]:
+        """
+        Fetch a feed with a conditional GET and reuse the previous parse when it has not changed.
+        A changed feed is parsed again in full; only building the article dicts is skipped for entries
+        seen in the previous parse.
+        """
+        state = self.feed_state.get(url)
+        headers = {}
+        if state.get('etag'):
+            headers['If-None-Match'] = state['etag']
+        if state.get('last_modified'):
+            headers['If-Modified-Since'] = state['last_modified']
+
+        async with self.session.get(url, headers=headers) as response:
+            if response.status == 304 and 'entries' in state:
+                logger.debug(f"{source_name} feed not modified")
+                return [dict(entry) for entry in state['entries']]
+            response.raise_for_status()
+            content = await response.text()
+            etag = response.headers.get('ETag')
+            last_modified = response.headers.get('Last-Modified')
+
+        content_hash = hashlib.sha1(content.encode('utf-8')).hexdigest()
+        if content_hash == state.get('content_hash') and 'entries' in state:
+            # Some servers ignore validators; an identical body still needs no parse
+            articles = state['entries']
+        else:
+            known = {entry['id']: entry for entry in state.get('entries', []) if entry.get('id')}
+            articles = await self.parse_feed(content, source_name, known=known)
+
+        self.feed_state.update(url, etag=etag, last_modified=last_modified, content_hash=content_hash,
+                               entries=articles)
+        return [dict(entry) for entry in articles]
+
+    async def parse_feed(self, content: str, source_name: str, limit: int = FEED_ENTRY_LIMIT,
+                         known: Optional[Dict[str, Dict]] = None) -> List[Dict]:
+        """Parse feed content in the feed executor and record how long the parse took."""
+        if not self.feed_executor:
+            self.feed_executor = create_feed_executor()
+
+        loop = asyncio.get_running_loop()
+        articles, elapsed = await loop.run_in_executor(self.feed_executor, parse_feed_entries,
+                                                       content, source_name, limit, known)
+
+        metric = self.parse_metrics.setdefault(source_name, {'count': 0, 'last_ms': 0.0, 'total_ms': 0.0})
+        metric['count'] += 1
+        metric['last_ms'] = round(elapsed * 1000, 2)
+        metric['total_ms'] = round(metric['total_ms'] + elapsed * 1000, 2)
+        return articles
 
     def load_subscribers(self):
-        """Load subscribers from JSON file if it exists."""
-        try:
-            with open('subscribers.json', 'r') as f:
-                self.subscribers = json.load(f)
-            logger.info(f"Loaded {len(self.subscribers)} subscribers")
-        except FileNotFoundError:
-            self.subscribers = {}
-            logger.info("No existing subscribers file found")
+        """Open the subscriber store, importing the legacy subscribers.json on first use."""
+        self.subscribers = create_subscriber_store()
+        self.subscriber_manager.index = self.subscribers
+        self.signup_buffer = SubscriberWriteBuffer(self.subscribers)
+        logger.info(f"Loaded {len(self.subscribers)} subscribers")
 
 
     # def save_subscribers(self):
@@ -161,36 +583,77 @@ class TechNewsAggregator:
     #         logger.info(f"Saved {len(self.subscribers)} subscribers")
     #     except Exception as e:
     #         logger.error(f"Error saving subscribers: {e}")
-    def save_subscribers(self):
-        """Save subscribers to JSON file."""
+
+    def health_status(self) -> Dict[str, Any]:
+        """Report liveness signals: per-source fetch results, the last send run and the subscriber count."""
         try:
-            with io.open('subscribers.json', 'w', encoding='utf-8') as f:
-                f.write(json.dumps(self.subscribers, ensure_ascii=False, indent=4))
-            logger.info(f"Saved {len(self.subscribers)} subscribers")
+            subscriber_count = len(self.subscribers)
         except Exception as e:
-            logger.error(f"Error saving subscribers: {e}")
-    def add_health_endpoint(self):
-        """Define the /health endpoint to check app status."""
-
-        @self.flask_app.route('/health', methods=['GET'])
-        def health():
-            health_status = {
-                "STATUS": "NORMAL",
-                "SUBSCRIBERS": len(self.subscribers),
-                "NEWS": bool(self.api_keys['newsapi']),
-                "GITHUB": bool(self.api_keys['github']),
-                "LAST_UPDATED": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            }
-            return make_response(jsonify(health_status), 200)
+            logger.error(f"Error counting subscribers: {e}")
+            subscriber_count = None
+        return {
+            "STATUS": "NORMAL" if subscriber_count is not None else "DEGRADED",
+            "SUBSCRIBERS": subscriber_count,
+            "NEWS": bool(self.api_keys['newsapi']),
+            "GITHUB": bool(self.api_keys['github']),
+            "SOURCES": self.stored_source_health(),
+            "LAST_SEND": self.last_send_run or self.stored_last_send(),
+            "SCHEDULE": self.scheduler.status() if self.scheduler else None,
+            "SIGNUP_BUFFER": self.signup_buffer.stats(),
+            "CACHE": cache.stats(),
+            "FEED_PARSE": self.parse_metrics,
+            "LAST_UPDATED": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        }
+
+    def readiness(self) -> Dict[str, bool]:
+        """Check the dependencies a request or send run needs before traffic is routed here."""
+        try:
+            # A single-row query against the store, or a length check for plain mappings
+            self.subscribers.version() if hasattr(self.subscribers, 'version') else len(self.subscribers)
+            store_ready = True
+        except Exception as e:
+            logger.error(f"Subscriber store not ready: {e}")
+            store_ready = False
+        return {
+            "SUBSCRIBER_STORE": store_ready,
+            "HTTP_SESSION": self.session is not None and not self.session.closed
+        }
+
+    def stored_last_send(self) -> Optional[Dict[str, Any]]:
+        """The latest run in the outbox, for a process that did not send it itself."""
+        try:
+            ledger = SendLedger()
+            try:
+                return ledger.last_run()
+            finally:
+                ledger.close()
+        except Exception as e:
+            logger.error(f"Error reading the last send run: {e}")
+            return None
 
-    def start_health_server(self, host='0.0.0.0', port=5001):
-        """Start the Flask server in a separate thread."""
-        thread = Thread(target=self.flask_app.run, kwargs={'host': host, 'port': port, 'use_reloader': False})
-        thread.daemon = True
-        thread.start()
-        logger.info(f"Health server started on port {port}")
+    def stored_source_health(self) -> Dict[str, Dict[str, Any]]:
+        """Per-source fetch results, recorded by whichever process fetched them."""
+        try:
+            if self.source_health is None:
+                self.source_health = SourceHealthLog()
+            return self.source_health.all()
+        except Exception as e:
+            logger.error(f"Error reading source health: {e}")
+            return {}
+
+    def record_source_health(self, fetch_key: str, result: Any):
+        """Remember when a source was last attempted and last returned articles."""
+        now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        # Fetchers swallow their own errors and return [], so only a non-empty result counts as success
+        articles = len(result) if isinstance(result, list) else 0
+        error = None if isinstance(result, list) else str(result)[:200]
+        try:
+            if self.source_health is None:
+                self.source_health = SourceHealthLog()
+            self.source_health.record(fetch_key, now, articles, articles > 0, error)
+        except Exception as e:
+            logger.error(f"Error recording health for {fetch_key}: {e}")
 
-    @cached(cache) # Cache for 1 hour
     # async def fetch_github_trending(self) -> List[Dict]:
     #     """Fetch GitHub trending repositories"""
     #     try:
@@ -210,6 +673,66 @@ class TechNewsAggregator:
     #         logger.error(f"Error fetching from GitHub: {e}")
     #         return []
 
+    async def github_get_json(self, url: str, headers: Dict[str, str]) -> Tuple[int, Any]:
+        """
+        GET a GitHub API resource through the rate limiter, revalidating cached bodies with If-None-Match.
+        A 304 reuses the cached body and does not count against the rate limit.
+        """
+        cache_key = (url, headers.get('Accept'))
+        cached_response = github_etag_cache.get(cache_key)
+        if cached_response:
+            headers = {**headers, 'If-None-Match': cached_response[0]}
+
+        async with self.github_limiter:
+            async with self.session.get(url, headers=headers) as response:
+                self.github_limiter.update(response.headers)
+                if response.status == 304 and cached_response:
+                    github_etag_cache.move_to_end(cache_key)
+                    return 200, cached_response[1]
+                if response.status != 200:
+                    return response.status, None
+
+                data = await response.json()
+                etag = response.headers.get('ETag')
+                if etag:
+                    github_etag_cache[cache_key] = (etag, data)
+                    github_etag_cache.move_to_end(cache_key)
+                    while len(github_etag_cache) > GITHUB_ETAG_CACHE_SIZE:
+                        github_etag_cache.popitem(last=False)
+                return 200, data
+
+    async def score_github_repo(self, repo: Dict, headers: Dict[str, str], today: str) -> Optional[Dict]:
+        """Probe a repository's stargazers and commits concurrently and compute its trending score."""
+        repo_name = repo['full_name']
+        try:
+            (activity_status, activity_data), (commits_status, commits_data) = await asyncio.gather(
+                self.github_get_json(f'https://api.github.com/repos/{repo_name}/stargazers',
+                                     {**headers, 'Accept': 'application/vnd.github.star+json'}),
+                self.github_get_json(f'https://api.github.com/repos/{repo_name}/commits', headers)
+            )
+        except GitHubRateLimitExceeded as e:
+            logger.warning(f"Skipping GitHub probes for {repo_name}: {e}")
+            return None
+
+        if activity_status != 200 or commits_status != 200:
+            return None
+
+        recent_stars = len([s for s in activity_data if s.get('starred_at', '').startswith(today)])
+        weekly_stars = repo['stargazers_count']
+        star_velocity = recent_stars / 1 if recent_stars > 0 else weekly_stars / 7
+
+        recent_commits = len([c for c in commits_data if c['commit']['author']['date'].startswith(today)])
+
+        score = (star_velocity * 3) + (recent_commits * 2) + (repo['forks_count'] * 0.5)
+
+        return {
+            'repo': repo,
+            'score': score,
+            'star_velocity': star_velocity,
+            'recent_commits': recent_commits
+        }
+
+    @cache.cached('GitHub Trending')
     async def fetch_github_trending(self) -> List[Dict]:
         """
         Fetch trending GitHub repositories using a sophisticated trending detection approach.
@@ -226,108 +749,87 @@ class TechNewsAggregator:
                 'Accept': 'application/vnd.github.v3+json'
             }
 
-
             query = f'created:>{week_ago} stars:>50 fork:false'
             url = f'https://api.github.com/search/repositories?q={query}&sort=stars&order=desc&per_page=50'
 
-            async with self.session.get(url, headers=headers) as response:
-                if response.status != 200:
-                    logger.error(f"GitHub API returned status {response.status}")
-                    return []
-
-                data = await response.json()
-                potential_trending = data.get('items', [])
-
-
-                trending_repos = []
-                for repo in potential_trending[:15]:
-                    repo_name = repo['full_name']
+            status, data = await self.github_get_json(url, headers)
+            if status != 200:
+                logger.error(f"GitHub API returned status {status}")
+                return []
 
+            potential_trending = data.get('items', [])
 
-                    activity_url = f'https://api.github.com/repos/{repo_name}/stargazers'
-                    async with self.session.get(activity_url, headers={
-                        **headers,
-                        'Accept': 'application/vnd.github.star+json'
-                    }) as activity_response:
-                        if activity_response.status == 200:
-                            activity_data = await activity_response.json()
+            # Probe all candidates at once; the limiter bounds concurrency and watches the quota
+            scored = await asyncio.gather(*(self.score_github_repo(repo, headers, today)
+                                            for repo in potential_trending[:15]))
+            trending_repos = [repo for repo in scored if repo]
 
-
-                            recent_stars = len([s for s in activity_data if s.get('starred_at', '').startswith(today)])
-                            weekly_stars = repo['stargazers_count']
-                            star_velocity = recent_stars / 1 if recent_stars > 0 else weekly_stars / 7
-
-
-                            commits_url = f'https://api.github.com/repos/{repo_name}/commits'
-                            async with self.session.get(commits_url, headers=headers) as commits_response:
-                                if commits_response.status == 200:
-                                    commits_data = await commits_response.json()
-                                    recent_commits = len(
-                                        [c for c in commits_data if c['commit']['author']['date'].startswith(today)])
-
-
-                                    score = (star_velocity * 3) + (recent_commits * 2) + (repo['forks_count'] * 0.5)
-
-                                    trending_repos.append({
-                                        'repo': repo,
-                                        'score': score,
-                                        'star_velocity': star_velocity,
-                                        'recent_commits': recent_commits
-                                    })
-
-                trending_repos.sort(key=lambda x: x['score'], reverse=True)
-                return [{
-                    'title': (f"{repo['repo']['full_name']} ({repo['repo']['stargazers_count']}★ | "
-                              f"+{round(repo['star_velocity'], 1)} stars/day | "
-                              f"{repo['recent_commits']} commits today) - {repo['repo']['description']}"
-                              if repo['repo']['description'] else
-                              f"{repo['repo']['full_name']} ({repo['repo']['stargazers_count']}★)"),
-                    'url': repo['repo']['html_url'],
-                    'source': 'GitHub Trending',
-                    'language': repo['repo']['language'],
-                    'score': round(repo['score'], 2)
-                } for repo in trending_repos[:5]]
+            trending_repos.sort(key=lambda x: x['score'], reverse=True)
+            return [{
+                'title': (f"{repo['repo']['full_name']} ({repo['repo']['stargazers_count']}★ | "
+                          f"+{round(repo['star_velocity'], 1)} stars/day | "
+                          f"{repo['recent_commits']} commits today) - {repo['repo']['description']}"
+                          if repo['repo']['description'] else
+                          f"{repo['repo']['full_name']} ({repo['repo']['stargazers_count']}★)"),
+                'url': repo['repo']['html_url'],
+                'source': 'GitHub Trending',
+                'language': repo['repo']['language'],
+                'score': round(repo['score'], 2),
+                'star_velocity': repo['star_velocity']
+            } for repo in trending_repos[:5]]
 
         except Exception as e:
             logger.error(f"Error fetching from GitHub: {e}")
             return []
 
-    async def fetch_hacker_news(self) -> List[Dict]:
-        """Fetch top stories from Hacker News."""
+    async def fetch_hacker_news_item(self, story_id: int) -> Optional[Dict]:
+        """Fetch a single Hacker News item, bounded by the item semaphore and cached by story id."""
+
+        async def load():
+            async with self.hn_semaphore:
+                async with self.session.get(f'{HN_API_URL}/item/{story_id}.json') as response:
+                    return await response.json()
+
+        return await hn_item_cache.get_or_fetch(story_id, hn_item_cache.ttl, load)
+
+    @cache.cached('Hacker News')
+    async def fetch_hacker_news(self, depth: Optional[int] = None) -> List[Dict]:
+        """Fetch the top ``depth`` stories from Hacker News, loading items concurrently."""
         try:
+            async with self.session.get(f'{HN_API_URL}/topstories.json') as response:
+                story_ids = (await response.json())[:depth or HN_DEPTH]
 
-            response = requests.get('https://hacker-news.firebaseio.com/v0/topstories.json')
-            story_ids = response.json()[:5]
+            items = await asyncio.gather(*(self.fetch_hacker_news_item(story_id) for story_id in story_ids),
+                                         return_exceptions=True)
 
             stories = []
-            for story_id in story_ids:
-                story_response = requests.get(f'https://hacker-news.firebaseio.com/v0/item/{story_id}.json')
-                story = story_response.json()
+            for story_id, story in zip(story_ids, items):
+                if isinstance(story, Exception):
+                    logger.error(f"Error fetching Hacker News item {story_id}: {story}")
+                    continue
+                if not story or story.get('deleted') or story.get('dead') or not story.get('title'):
+                    continue
                 stories.append({
                     'title': story.get('title'),
                     'url': story.get('url', f'https://news.ycombinator.com/item?id={story_id}'),
                     'description': story.get('text', '')[:200] + '...' if story.get(
                         'text') else 'Check out the article for more details.',
-                    'source': 'Hacker News'
+                    'source': 'Hacker News',
+                    'points': story.get('score', 0),
+                    'comments': story.get('descendants', 0),
+                    'published': story.get('time')
                 })
             return stories
         except Exception as e:
-            print(f"Error fetching from Hacker News: {e}")
+            logger.error(f"Error fetching from Hacker News: {e}")
             return []
 
+    @cache.cached('Science Daily')
     async def fetch_science_daily(self) -> List[Dict]:
         """Fetch technology news from Science Daily RSS feed"""
         try:
-            async with self.session.get('https://www.sciencedaily.com/rss/computers_math/technology.xml') as response:
-                content = await response.text()
-                feed = feedparser.parse(content)
-                return [{
-                    'title': entry.title,
-                    'url': entry.link,
-                    'description': entry.summary[:200] + '...' if hasattr(entry,
-                                                                          'summary') else 'No description available',
-                    'source': 'Science Daily'
-                } for entry in feed.entries[:5]]
+            return await self.fetch_feed('https://www.sciencedaily.com/rss/computers_math/technology.xml',
+                                         'Science Daily')
         except Exception as e:
             logger.error(f"Error fetching from Science Daily: {e}")
             return []
@@ -349,23 +851,20 @@ class TechNewsAggregator:
     #     except Exception as e:
     #         logger.error(f"Error fetching from NewsAPI: {e}")
     #         return []
+    @cache.cached('NewsAPI')
     async def fetch_newsapi_tech(self) -> List[Dict]:
         """
-        Fetch tech news from multiple sources with improved diversity and randomness
+        Fetch tech news for every NewsAPI-backed source in one request.
+        Returns up to 5 articles per source; fetch_source_snapshot splits them by source name.
         """
         try:
-
-            sources = [
-                'techcrunch,the-verge,wired'
-            ]
-
+            # NewsAPI rejects country/category combined with sources, so only sources are sent
+            sources = 'techcrunch,the-verge,wired'
 
             async with self.session.get(
                     f'https://newsapi.org/v2/top-headlines?'
-                    f'country=us&'
-                    f'category=technology&'
                     f'sources={sources}&'
-                    f'pageSize=10&'  
+                    f'pageSize=30&'
                     f'apiKey={self.api_keys["newsapi"]}'
             ) as response:
                 data = await response.json()
@@ -380,95 +879,100 @@ class TechNewsAggregator:
 
                 unique_articles = []
                 seen_titles = set()
+                per_source = {}
                 for article in articles:
+                    source_name = article['source']['name']
                     if (article['title'] and article['title'] not in seen_titles and
                             len(article['title']) > 10 and
-                            'placeholder' not in article['title'].lower()):
+                            'placeholder' not in article['title'].lower() and
+                            per_source.get(source_name, 0) < 5):
                         unique_articles.append({
                             'title': article['title'],
                             'url': article['url'],
-                            'source': article['source']['name'],
-                            'description': article.get('description', 'No description available')[:200] + '...'
+                            'source': source_name,
+                            'description': (article.get('description') or 'No description available')[:200] + '...',
+                            'published': article.get('publishedAt')
                         })
                         seen_titles.add(article['title'])
-
-                    if len(unique_articles) >= 5:
-                        break
+                        per_source[source_name] = per_source.get(source_name, 0) + 1
 
                 return unique_articles
 
         except Exception as e:
             logger.error(f"Error fetching from NewsAPI: {e}")
             return []
+    @cache.cached('Dev.to')
     async def fetch_dev_to(self) -> List[Dict]:
         """Fetch top articles from Dev.to."""
         try:
-            response = requests.get('https://dev.to/api/articles?top=1&per_page=10')
-            articles = response.json()
+            async with self.session.get('https://dev.to/api/articles?top=1&per_page=10') as response:
+                articles = await response.json()
             return [{
                 'title': article['title'],
                 'url': article['url'],
-                'source': 'Dev.to'
+                'source': 'Dev.to',
+                'points': article.get('public_reactions_count'),
+                'comments': article.get('comments_count'),
+                'published': article.get('published_timestamp')
             } for article in articles]
         except Exception as e:
-            print(f"Error fetching from Dev.to: {e}")
+            logger.error(f"Error fetching from Dev.to: {e}")
             return []
 
+    @cache.cached('Stack Exchange')
     async def fetch_stack_exchange(self) -> List[Dict]:
         """Fetch hot questions from Stack Overflow."""
         try:
-            response = requests.get(
+            async with self.session.get(
                 'https://api.stackexchange.com/2.3/questions',
                 params={
                     'site': 'stackoverflow',
                     'sort': 'hot',
                     'pagesize': 10
                 }
-            )
-            questions = response.json()['items']
+            ) as response:
+                questions = (await response.json())['items']
             return [{
                 'title': question['title'],
                 'url': question['link'],
-                'source': 'Stack Exchange'
+                'source': 'Stack Exchange',
+                'points': question.get('score'),
+                'comments': question.get('answer_count'),
+                'published': question.get('creation_date')
             } for question in questions]
         except Exception as e:
-            print(f"Error fetching from Stack Exchange: {e}")
+            logger.error(f"Error fetching from Stack Exchange: {e}")
             return []
 
+    @cache.cached('Reddit')
     async def fetch_reddit(self) -> List[Dict]:
         """Fetch top posts from r/programming."""
         try:
             headers = {'User-Agent': 'TechNewsAggregator/1.0'}
-            response = requests.get(
+            async with self.session.get(
                 'https://www.reddit.com/r/programming/top.json?limit=10',
                 headers=headers
-            )
-            posts = response.json()['data']['children']
+            ) as response:
+                posts = (await response.json())['data']['children']
             return [{
                 'title': post['data']['title'],
                 'url': f"https://reddit.com{post['data']['permalink']}",
-                'source': 'Reddit'
+                # Link posts point elsewhere; dedup uses this to match the story from other sources
+                'target_url': None if post['data'].get('is_self') else post['data'].get('url'),
+                'source': 'Reddit',
+                'points': post['data'].get('score'),
+                'comments': post['data'].get('num_comments'),
+                'published': post['data'].get('created_utc')
             } for post in posts]
         except Exception as e:
-            print(f"Error fetching from Reddit: {e}")
+            logger.error(f"Error fetching from Reddit: {e}")
             return []
 
+    @cache.cached('RSS')
     async def fetch_rss_feed_with_description(self, url: str, source_name: str) -> List[Dict]:
         """Fetch articles with descriptions from an RSS feed."""
         try:
-            async with self.session.get(url) as response:
-                content = await response.text()
-                feed = feedparser.parse(content)
-                return [
-                    {
-                        'title': entry.title,
-                        'url': entry.link,
-                        'description': (entry.summary[:200] + '...') if hasattr(entry,
-                                                                                'summary') else 'No description available',
-                        'source': source_name
-                    }
-                    for entry in feed.entries[:5]
-                ]
+            return await self.fetch_feed(url, source_name)
         except Exception as e:
             logger.error(f"Error fetching RSS feed from {source_name}: {e}")
             return []
@@ -509,79 +1013,183 @@ class TechNewsAggregator:
     #
     #     return all_news
 
-    async def fetch_all_sources(self, email: str) -> List[Dict]:
-        """Fetch news based on the user's selected category or preferences from JSON file."""
-
-        # Categories mapping
-        category_mapping = {
-            "Programming": ["Hacker News", "Reddit", "Dev.to", "Stack Exchange", "GitHub Trending"],
-            "Tech & AI": ["The Verge", "Wired", "Ars Technica", "VentureBeat", "ZDNet", "TechRadar", "Hackernoon",
-                          "Science Daily"]
+    def get_source_registry(self) -> Dict[str, Tuple[str, Callable[[], Awaitable[List[Dict]]]]]:
+        """
+        Map each selectable source name to the physical fetch backing it as (fetch key, fetcher).
+        Sources sharing a fetch key are fetched once and split by each article's source name.
+        """
+        return {
+            "Hacker News": ("Hacker News", self.fetch_hacker_news),
+            "Reddit": ("Reddit", self.fetch_reddit),
+            "Dev.to": ("Dev.to", self.fetch_dev_to),
+            "Stack Exchange": ("Stack Exchange", self.fetch_stack_exchange),
+            "GitHub Trending": ("GitHub Trending", self.fetch_github_trending),
+            "The Verge": ("NewsAPI", self.fetch_newsapi_tech),
+            "Wired": ("NewsAPI", self.fetch_newsapi_tech),
+            "Ars Technica": ("Ars Technica", lambda: self.fetch_rss_feed_with_description(
+                'https://arstechnica.com/feed/', 'Ars Technica')),
+            "VentureBeat": ("VentureBeat", lambda: self.fetch_rss_feed_with_description(
+                'https://venturebeat.com/feed/', 'VentureBeat')),
+            "ZDNet": ("ZDNet", lambda: self.fetch_rss_feed_with_description(
+                'https://www.zdnet.com/news/rss.xml', 'ZDNet')),
+            "TechRadar": ("TechRadar", lambda: self.fetch_rss_feed_with_description(
+                'https://www.techradar.com/rss', 'TechRadar')),
+            "Hackernoon": ("Hackernoon", lambda: self.fetch_rss_feed_with_description(
+                'https://hackernoon.com/feed', 'Hackernoon')),
+            "Science Daily": ("Science Daily", self.fetch_science_daily)
         }
 
-        user_preferences = self.subscribers.get(email, [])
+    def resolve_sources(self, email: str, preferences: Optional[List[str]] = None) -> List[str]:
+        """Expand a subscriber's stored (or given) preferences into the list of sources to fetch."""
+        user_preferences = preferences if preferences is not None else self.subscribers.get(email, [])
         if not user_preferences:
-            user_preferences = category_mapping["Tech & AI"]
-
-        elif len(user_preferences) == 1 and user_preferences[0] in category_mapping:
-            user_preferences = category_mapping[user_preferences[0]]
-
-        source_mapping = {
-            "Hacker News": self.fetch_hacker_news,
-            "Reddit": self.fetch_reddit,
-            "Dev.to": self.fetch_dev_to,
-            "Stack Exchange": self.fetch_stack_exchange,
-            "GitHub Trending": self.fetch_github_trending,
-            "The Verge": self.fetch_newsapi_tech,
-            "Wired": self.fetch_newsapi_tech,
-            "Ars Technica": lambda: self.fetch_rss_feed_with_description('https://arstechnica.com/feed/',
-                                                                         'Ars Technica'),
-            "VentureBeat": lambda: self.fetch_rss_feed_with_description('https://venturebeat.com/feed/', 'VentureBeat'),
-            "ZDNet": lambda: self.fetch_rss_feed_with_description('https://www.zdnet.com/news/rss.xml', 'ZDNet'),
-            "TechRadar": lambda: self.fetch_rss_feed_with_description('https://www.techradar.com/rss', 'TechRadar'),
-            "Hackernoon": lambda: self.fetch_rss_feed_with_description('https://hackernoon.com/feed', 'Hackernoon'),
-            "Science Daily": self.fetch_science_daily
-        }
+            return CATEGORY_MAPPING["Tech & AI"]
+
+        if len(user_preferences) == 1 and user_preferences[0] in CATEGORY_MAPPING:
+            return CATEGORY_MAPPING[user_preferences[0]]
+
+        return user_preferences
+
+    def subscribed_sources(self) -> Set[str]:
+        """
+        Return the union of every subscriber's sources.
+        The scan is cached against the store version, so it only reruns after some process changed subscribers.
+        """
+        version = self.subscribers.version() if hasattr(self.subscribers, 'version') else None
+        if version is None or version != self.subscribed_sources_version:
+            sources = set()
+            for preferences in self.subscribers.distinct_preferences():
+                sources.update(self.resolve_sources('', preferences))
+            self.cached_subscribed_sources = sources
+            self.subscribed_sources_version = version
+        return set(self.cached_subscribed_sources)
+
+    async def fetch_source_snapshot(self, sources: Optional[Iterable[str]] = None) -> Dict[str, List[Dict]]:
+        """
+        Fetch every requested source exactly once and return the results keyed by source name.
+        When no sources are given, the union of all subscribers' sources is fetched.
+        """
+        if sources is None:
+            sources = self.subscribed_sources()
 
-        tasks = [source_mapping[source]() for source in user_preferences if source in source_mapping]
+        await self.initialize_session()
+        registry = self.get_source_registry()
+        names = [source for source in dict.fromkeys(sources) if source in registry]
 
-        results = await asyncio.gather(*tasks, return_exceptions=True)
+        # One fetch per physical source, however many selected sources it backs
+        fetchers = {}
+        for name in names:
+            fetch_key, fetcher = registry[name]
+            fetchers.setdefault(fetch_key, fetcher)
 
-        all_news = []
-        for result in results:
+        results = await asyncio.gather(*(fetcher() for fetcher in fetchers.values()), return_exceptions=True)
+
+        fetched = {}
+        for fetch_key, result in zip(fetchers, results):
+            self.record_source_health(fetch_key, result)
             if isinstance(result, list):
-                all_news.extend(result)
+                fetched[fetch_key] = result
+            else:
+                logger.error(f"Error fetching news from {fetch_key}: {result}")
+                fetched[fetch_key] = []
+
+        snapshot = {}
+        for name in names:
+            fetch_key = registry[name][0]
+            if fetch_key == name:
+                snapshot[name] = fetched[fetch_key]
             else:
-                logger.error(f"Error fetching news: {result}")
+                snapshot[name] = [article for article in fetched[fetch_key] if article['source'] == name]
+
+        logger.info(f"Fetched source snapshot for {len(snapshot)} sources with {len(fetchers)} fetches")
+        return snapshot
+
+    async def fetch_all_sources(self, email: str, snapshot: Optional[Dict[str, List[Dict]]] = None,
+                                preferences: Optional[List[str]] = None) -> List[Dict]:
+        """
+        Fetch news based on the user's selected category or preferences from the subscriber store.
+        Sources already present in ``snapshot`` are served from it instead of being fetched again.
+        Articles come back ranked best first across sources, and a story reported by several sources
+        is kept once, under the source whose copy ranks highest.
+        """
+        user_preferences = self.resolve_sources(email, preferences)
 
-        return all_news
+        if snapshot is None:
+            snapshot = {}
+        missing = [source for source in user_preferences if source not in snapshot]
+        if missing:
+            snapshot = {**snapshot, **await self.fetch_source_snapshot(missing)}
+
+        return self.ranker.candidates(snapshot, dict.fromkeys(user_preferences))
 
     def validate_email(self, email: str) -> bool:
         """Validate email format"""
         pattern = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'
         return bool(re.match(pattern, email))
 
-    def add_subscriber(self, email: str, preferences: Optional[List[str]] = None):
-        """Add a new subscriber with their preferences."""
+    def validate_delivery(self, timezone: Optional[str], delivery_hour: Optional[int]):
+        """Reject unknown timezone names and hours outside 0-23."""
+        if timezone and timezone not in pytz.all_timezones_set:
+            raise ValueError(f"Unknown timezone: {timezone}")
+        if delivery_hour is not None and not 0 <= delivery_hour <= 23:
+            raise ValueError("Delivery hour must be between 0 and 23")
+
+    def prepare_subscriber(self, email: str, preferences: Optional[List[str]] = None,
+                           timezone: Optional[str] = None, delivery_hour: Optional[int] = None) -> List[str]:
+        """Validate a signup and return the preferences to store, filling in the defaults."""
         if not self.validate_email(email):
             logger.error(f"Invalid email format: {email}")
             raise ValueError("Invalid email format")
+        self.validate_delivery(timezone, delivery_hour)
+        # Anything but a list of names would only fail later, inside the store's commit
+        if preferences is not None and (not isinstance(preferences, list)
+                                        or not all(isinstance(name, str) for name in preferences)):
+            raise ValueError("Preferences must be a list of source names")
 
         if preferences is None:
             preferences = ['Hacker News', 'Reddit', 'Dev.to', 'Stack Exchange', 'GitHub Trending',
                            'The Verge', 'Wired', 'Ars Technica', 'VentureBeat', 'ZDNet',
                            'TechRadar', 'Hackernoon', 'Science Daily']
+        return preferences
+
+    def add_subscriber(self, email: str, preferences: Optional[List[str]] = None,
+                       timezone: Optional[str] = None, delivery_hour: Optional[int] = None):
+        """Add a new subscriber with their preferences and, optionally, when they want their digest."""
+        preferences = self.prepare_subscriber(email, preferences, timezone, delivery_hour)
 
         self.subscribers[email] = preferences
-        self.save_subscribers()
+        if (timezone or delivery_hour is not None) and hasattr(self.subscribers, 'set_delivery'):
+            self.subscribers.set_delivery(email, timezone or '', delivery_hour)
         logger.info(f"Added subscriber: {email} with {len(preferences)} preferences")
 
+    def queue_subscriber(self, email: str, preferences: Optional[List[str]] = None,
+                         timezone: Optional[str] = None, delivery_hour: Optional[int] = None):
+        """
+        Validate a signup and hand it to the write buffer without touching disk.
+        It is persisted with the buffer's next group commit; must be called from the event loop.
+        """
+        preferences = self.prepare_subscriber(email, preferences, timezone, delivery_hour)
+        delivery = (timezone or '', delivery_hour) if timezone or delivery_hour is not None else None
+        self.signup_buffer.submit(email, preferences, delivery)
+        logger.debug(f"Queued subscriber: {email} with {len(preferences)} preferences")
+
+    def import_subscribers(self, lines: Iterable[str], fmt: str = 'csv',
+                           chunk_size: int = BULK_CHUNK_SIZE) -> Dict[str, Any]:
+        """Validate and upsert subscribers from CSV or NDJSON lines in chunks, reporting bad rows."""
+        return bulk_import(self.subscribers, lines, fmt, self.prepare_subscriber, chunk_size)
+
+    def export_subscribers(self, fmt: str = 'csv') -> Iterable[str]:
+        """Stream every subscriber as CSV or NDJSON text chunks."""
+        return bulk_export(self.subscribers, fmt)
+
     def remove_subscriber(self, email: str):
-        """Remove a subscriber."""
+        """Remove a subscriber, including a signup still waiting in the write buffer."""
+        pending = self.signup_buffer.discard(email)
         if email in self.subscribers:
             del self.subscribers[email]
-            self.save_subscribers()
             logger.info(f"Removed subscriber: {email}")
+        elif pending:
+            logger.info(f"Removed buffered signup: {email}")
         else:
             logger.warning(f"Attempt to remove non-existent subscriber: {email}")
 
@@ -1054,72 +1662,76 @@ class TechNewsAggregator:
     #     """
     #
     #     return html
-    async def generate_newsletter(self, email: str) -> str:
-        """Generate an HTML newsletter with categorized tech news."""
-
-        news_articles = await self.fetch_all_sources(email)
-
-        if not news_articles:
-            return "<p>No news available today. Check back tomorrow!</p>"
-
-        # Group news by source
+    def preference_fingerprint(self, email: str, preferences: Optional[List[str]] = None) -> Tuple[str, ...]:
+        """Canonical, order-independent key for a subscriber's resolved sources."""
+        if self.source_order is None:
+            self.source_order = {source: position for position, source in enumerate(self.get_source_registry())}
+        order = self.source_order
+        return tuple(sorted(set(self.resolve_sources(email, preferences)),
+                            key=lambda source: (order.get(source, len(order)), source)))
+
+    def render_newsletter_body(self, news_articles: List[Dict]) -> str:
+        """Render everything in the newsletter except the per-subscriber footer."""
         news_by_source = {}
         for article in news_articles:
-            if article["source"] not in news_by_source:
-                news_by_source[article["source"]] = []
-            news_by_source[article["source"]].append(article)
-
-        # Generate HTML content
-        html = """
-        <html>
-        <head>
-            <meta charset="UTF-8">
-            <meta name="viewport" content="width=device-width, initial-scale=1.0">
-            <style>
-                body { font-family: Arial, sans-serif; max-width: 650px; margin: 0 auto; padding: 20px; color: #333; }
-                .header { text-align: center; margin-bottom: 40px; }
-                .header h1 { font-size: 36px; font-weight: bold; margin: 0; }
-                .section { margin-bottom: 40px; }
-                .section-title { font-size: 24px; font-weight: bold; margin-bottom: 10px; border-bottom: 2px solid #ddd; padding-bottom: 5px; }
-                .article { margin-bottom: 20px; }
-                .article-title { font-size: 18px; font-weight: bold; color: #0073e6; text-decoration: none; }
-                .article-title:hover { text-decoration: underline; }
-                .article-description { font-size: 16px; color: #666; margin: 8px 0; }
-                .article-meta { font-size: 14px; color: #999; }
-                .footer { text-align: center; font-size: 14px; color: #777; margin-top: 40px; padding-top: 20px; border-top: 1px solid #ddd; }
-                .unsubscribe { color: red; text-decoration: none; }
-            </style>
-        </head>
-        <body>
-            <div class="header">
-                <h1>OnePaper</h1>
-                <p>Your daily dose of programming & AI news</p>
-            </div>
-        """
+            news_by_source.setdefault(article["source"], []).append(article)
 
+        parts = [NEWSLETTER_HEADER]
         for source, articles in news_by_source.items():
-            html += f'<div class="section"><h2 class="section-title">{source}</h2>'
+            parts.append(SECTION_OPEN_TEMPLATE.format(source=source))
             for article in articles:
-                html += f"""
-                    <div class="article">
-                        <a href="{article['url']}" class="article-title">{article['title']}</a>
-                        <p class="article-description">{article.get('description', '')}</p>
-                        <p class="article-meta">Source: {article['source']}</p>
-                    </div>
-                """
-            html += '</div>'
-
-        links = self.get_management_links(email)
-        html += f"""
-            <div class="footer">
-                <p>Enjoyed this newsletter? Share it with friends!</p>
-                <p><a href="{links['preferences']}">Manage Preferences</a> | <a href="{links['unsubscribe']}" class="unsubscribe">Unsubscribe</a></p>
-            </div>
-        </body>
-        </html>
+                parts.append(ARTICLE_TEMPLATE.format(url=article['url'], title=article['title'],
+                                                     description=article.get('description', ''),
+                                                     source=article['source']))
+            parts.append(SECTION_CLOSE)
+        return ''.join(parts)
+
+    def render_newsletter_footer(self, email: str, links: Optional[Dict[str, str]] = None) -> str:
+        """Render the footer carrying the subscriber's management links."""
+        if links is None:
+            links = self.get_management_links(email)
+        return FOOTER_TEMPLATE.format(preferences=links['preferences'], unsubscribe=links['unsubscribe'])
+
+    def select_articles(self, news_articles: List[Dict], fingerprint: Tuple[str, ...],
+                        archive: Optional[ArticleArchive] = None, run_day: Optional[str] = None) -> List[Dict]:
+        """Pick the top-ranked articles, skipping what the preference group was already sent on earlier days."""
+        if archive is None:
+            return self.ranker.top(news_articles)
+        group = archive.group_key(fingerprint)
+        selected = self.ranker.top(news_articles, archive.sent_before(group, run_day))
+        if not selected:
+            # A repeat digest beats an empty one when every source is slow-moving
+            logger.info(f"Every article for {', '.join(fingerprint)} was sent before; repeating them")
+            selected = self.ranker.top(news_articles)
+        archive.record_sent(group, run_day, selected)
+        return selected
+
+    async def generate_newsletter(self, email: str, snapshot: Optional[Dict[str, List[Dict]]] = None,
+                                  body_cache: Optional[Dict[Tuple[str, ...], Optional[str]]] = None,
+                                  preferences: Optional[List[str]] = None,
+                                  links: Optional[Dict[str, str]] = None,
+                                  archive: Optional[ArticleArchive] = None, run_day: Optional[str] = None) -> str:
+        """
+        Generate an HTML newsletter with categorized tech news.
+        Bodies are rendered once per preference fingerprint when a ``body_cache`` is shared across calls,
+        and ``links`` lets a send run pass in management links it already minted. The best-ranked articles
+        across the subscriber's sources are kept. With an ``archive``, articles the subscriber's preference
+        group got before ``run_day`` are left out and the ones sent now are recorded.
         """
+        fingerprint = self.preference_fingerprint(email, preferences)
+        if body_cache is not None and fingerprint in body_cache:
+            body = body_cache[fingerprint]
+        else:
+            news_articles = self.select_articles(await self.fetch_all_sources(email, snapshot, preferences),
+                                                 fingerprint, archive, run_day)
+            body = self.render_newsletter_body(news_articles) if news_articles else None
+            if body_cache is not None:
+                body_cache[fingerprint] = body
+
+        if body is None:
+            return "<p>No news available today. Check back tomorrow!</p>"
 
-        return html
+        return body + self.render_newsletter_footer(email, links)
 
     # async def send_newsletter(self):
     #     """Send newsletter to all subscribers."""
@@ -1159,69 +1771,251 @@ class TechNewsAggregator:
     #
     #     except Exception as e:
     #         logger.error(f"Error in SMTP connection: {e}")
-    async def send_newsletter(self):
-        """Send newsletter to all subscribers."""
+    async def send_newsletter(self, snapshot: Optional[Dict[str, List[Dict]]] = None,
+                              recipients: Optional[Iterable[str]] = None, run_date: Optional[str] = None,
+                              record_articles: bool = True):
+        """
+        Send newsletter to all subscribers, or only ``recipients``, reusing ``snapshot`` when sources were
+        already fetched. ``run_date`` keys the outbox; it defaults to today, so a day's run is sent once.
+        Without ``record_articles`` the run neither skips nor records articles in the sent archive.
+        """
+        from email.mime.multipart import MIMEMultipart
+        from email.mime.text import MIMEText
+
         if not self.subscribers:
             logger.info("No subscribers to send newsletter to")
             return
 
+        # The ledger remembers who already got today's digest, so a restarted run resumes where it stopped
+        run_date = run_date or datetime.now().strftime('%Y-%m-%d')
+        # One run per date at a time, so a resumed run and a new wave never send the same queued rows
+        async with self.send_locks.setdefault(run_date, asyncio.Lock()):
+            try:
+                # Fetch every source referenced by any subscriber once for the whole run,
+                # topping up a prefetched snapshot with sources subscribers picked since it was taken
+                if snapshot is None:
+                    snapshot = await self.fetch_source_snapshot()
+                else:
+                    missing = self.subscribed_sources() - snapshot.keys()
+                    if missing:
+                        snapshot = {**snapshot, **await self.fetch_source_snapshot(missing)}
+
+                # Bodies are cached per preference fingerprint, so memory grows with distinct sets, not subscribers
+                body_cache = {}
+
+                ledger = SendLedger()
+                ledger.prune()
+                self.last_send_run = {'run_date': run_date, 'state': 'running',
+                                      'started_at': datetime.now().strftime("%Y-%m-%d %H:%M:%S")}
+                ledger.enqueue(run_date, iter(self.subscribers) if recipients is None else recipients)
+
+                def record(email: str, error: Optional[Exception], transient: bool):
+                    if error is None:
+                        ledger.mark_sent(run_date, email)
+                    else:
+                        ledger.mark_failed(run_date, email, error, transient)
+
+                async def messages():
+                    # Pages of due recipients are rendered lazily; the engine's bounded queue applies backpressure
+                    for recipients in ledger.iter_pending(run_date, SEND_PAGE_SIZE):
+                        page = self.subscribers.get_many(recipients)
+                        page_links = self.get_management_links_batch(page)
+                        for email in recipients:
+                            if email not in page:
+                                # Unsubscribed since the run was queued
+                                ledger.mark_failed(run_date, email, ValueError("No longer subscribed"), False)
+                                continue
+                            msg = await build(email, page[email], page_links[email])
+                            if msg is not None:
+                                yield email, msg
+
+                async def build(email: str, preferences: List[str],
+                                links: Dict[str, str]) -> Optional[MIMEMultipart]:
+                    try:
+                        newsletter_content = await self.generate_newsletter(email, snapshot, body_cache,
+                                                                            preferences, links, archive, run_date[:10])
+                        msg = MIMEMultipart('alternative')
+                        msg['Subject'] = f"Tech News - {datetime.now().strftime('%Y-%m-%d')}"
+                        msg['From'] = formataddr((self.sender_name, self.email_sender))
+                        msg['To'] = email
+
+                        html_part = MIMEText(newsletter_content, 'html')
+                        msg.attach(html_part)
+                        return msg
+                    except Exception as e:
+                        logger.error(f"Error building newsletter for {email}: {e}")
+                        ledger.mark_failed(run_date, email, e, False)
+                        return None
+
+                # What each preference group got on earlier days, so slow-moving sources do not repeat
+                archive = ArticleArchive() if SKIP_SENT_ARTICLES and record_articles else None
+                if archive is not None:
+                    archive.prune(run_date[:10])
+
+                engine = SMTPDeliveryEngine.from_env(self.email_sender, self.email_password)
+                try:
+                    while True:
+                        if ledger.has_pending(run_date):
+                            self.last_delivery_stats = await engine.deliver(messages(), record)
+                            continue
+                        next_retry_at = ledger.next_retry_at(run_date)
+                        if next_retry_at is None:
+                            break
+                        await asyncio.sleep(max(0.0, next_retry_at - time.time()))
+                    summary = ledger.summary(run_date)
+                    self.last_send_run.update(state='completed', summary=summary, delivery=self.last_delivery_stats,
+                                              finished_at=datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
+                    logger.info(f"Completed sending newsletters: {summary}")
+                finally:
+                    ledger.close()
+                    if archive is not None:
+                        archive.close()
+
+            except Exception as e:
+                self.last_send_run.update(state='failed', error=str(e)[:200])
+                logger.error(f"Error in SMTP connection: {e}")
+
+    def current_run_dates(self) -> Set[str]:
+        """Run dates that are still today: the server's date, or each delivery timezone's local date in waves."""
+        if DELIVERY_MODE != 'waves':
+            return {datetime.now().strftime('%Y-%m-%d')}
+        default_timezone, _ = self.default_delivery_slot()
+        stored = self.subscribers.delivery_slots() if hasattr(self.subscribers, 'delivery_slots') else [('', None)]
+        now = datetime.now(pytz.UTC)
+        dates = set()
+        for timezone in {timezone or default_timezone for timezone, _ in stored}:
+            try:
+                dates.add(now.astimezone(pytz.timezone(timezone)).strftime('%Y-%m-%d'))
+            except pytz.UnknownTimeZoneError:
+                continue
+        return dates
+
+    async def resume_unfinished_runs(self):
+        """
+        Finish today's send runs a previous process left with queued recipients. Older runs are expired
+        rather than resent, since they would go out days late with today's articles.
+        """
+        current = self.current_run_dates()
+        ledger = SendLedger()
         try:
-            server = smtplib.SMTP('smtp.gmail.com', 587)
-            server.starttls()
-            server.login(self.email_sender, self.email_password)
-
-            for email, _ in self.subscribers.items():
+            ledger.prune()
+            ledger.expire_runs(current)
+            run_dates = [run_date for run_date in ledger.unfinished_runs() if run_date in current]
+        finally:
+            ledger.close()
+        for run_date in run_dates:
+            logger.info(f"Resuming unfinished send run {run_date}")
+            # Only the recipients already queued for that run are sent; nobody new is added to it
+            await self.send_newsletter(recipients=(), run_date=run_date)
+
+    async def watch_subscribers(self):
+        """Refresh subscriber-derived state whenever another process changes the subscriber store."""
+        if not hasattr(self.subscribers, 'version'):
+            return
+        async for version in watch_versions(self.subscribers):
+            sources = self.subscribed_sources()
+            logger.info(f"Subscriber store changed (version {version}): "
+                        f"{len(self.subscribers)} subscribers across {len(sources)} sources")
+
+    def default_delivery_slot(self) -> Tuple[str, int]:
+        """Timezone and hour used for subscribers who have not picked their own."""
+        return (os.getenv('NEWSLETTER_TIMEZONE', 'UTC'),
+                int(os.getenv('NEWSLETTER_TIME', '09:00').split(':')[0]))
+
+    def wave_slots(self, wave_at: datetime) -> List[Tuple[str, Optional[int]]]:
+        """Return the stored (timezone, hour) slots whose preferred local hour began in the hour up to ``wave_at``."""
+        default_timezone, default_hour = self.default_delivery_slot()
+        stored = self.subscribers.delivery_slots() if hasattr(self.subscribers, 'delivery_slots') else [('', None)]
+        due = []
+        hours_by_timezone: Dict[str, Set[int]] = {}
+        for timezone, hour in stored:
+            timezone_name = timezone or default_timezone
+            if timezone_name not in hours_by_timezone:
                 try:
-                    newsletter_content = await self.generate_newsletter(email)
-                    msg = MIMEMultipart('alternative')
-                    msg['Subject'] = f"Tech News - {datetime.now().strftime('%Y-%m-%d')}"
-                    msg['From'] = formataddr((self.sender_name, self.email_sender))
-                    msg['To'] = email
-
-                    links = self.get_management_links(email)
-
-                    newsletter_content = newsletter_content.replace("{{unsubscribe_link}}", links['unsubscribe'])
-                    newsletter_content = newsletter_content.replace("{{preferences_link}}", links['preferences'])
-                    newsletter_content = newsletter_content.replace("{{subscriber_email}}", email)
-
-                    html_part = MIMEText(newsletter_content, 'html')
-                    msg.attach(html_part)
-
-                    server.send_message(msg)
-                    logger.info(f"Newsletter sent to {email}")
-                except Exception as e:
-                    logger.error(f"Error sending newsletter to {email}: {e}")
+                    hours_by_timezone[timezone_name] = local_hours_started(pytz.timezone(timezone_name), wave_at)
+                except pytz.UnknownTimeZoneError:
+                    logger.error(f"Skipping subscribers in unknown timezone {timezone_name}")
+                    hours_by_timezone[timezone_name] = set()
+            if (default_hour if hour is None else hour) in hours_by_timezone[timezone_name]:
+                due.append((timezone, hour))
+        return due
+
+    async def fresh_snapshot(self) -> Dict[str, List[Dict]]:
+        """Return the source snapshot shared by delivery waves, refetching it after SNAPSHOT_MAX_AGE seconds."""
+        if self.wave_snapshot is None or time.monotonic() - self.wave_snapshot[0] > SNAPSHOT_MAX_AGE:
+            self.wave_snapshot = (time.monotonic(), await self.fetch_source_snapshot())
+        return self.wave_snapshot[1]
+
+    async def prefetch_wave(self) -> Optional[Dict[str, List[Dict]]]:
+        """Warm the snapshot ahead of the next wave, skipping the fetch when nobody is due in it."""
+        wave_at = datetime.now(pytz.UTC).replace(minute=0, second=0, microsecond=0) + timedelta(hours=1)
+        if not self.wave_slots(wave_at):
+            return None
+        return await self.fresh_snapshot()
+
+    async def send_wave(self, snapshot: Optional[Dict[str, List[Dict]]] = None,
+                        wave_at: Optional[datetime] = None):
+        """Send the digest to every subscriber whose preferred local hour has just started (at ``wave_at``, UTC)."""
+        wave_at = wave_at or datetime.now(pytz.UTC).replace(minute=0, second=0, microsecond=0)
+        slots = self.wave_slots(wave_at)
+        if not slots:
+            logger.debug(f"No subscribers due in the {wave_at:%H:00} UTC wave")
+            return
+        # The outbox is keyed by each subscriber's local date, so moving to a later hour or another timezone
+        # after today's digest went out does not send a second one that day
+        default_timezone, _ = self.default_delivery_slot()
+        slots_by_date: Dict[str, List[Tuple[str, Optional[int]]]] = {}
+        for timezone, hour in slots:
+            local_date = wave_at.astimezone(pytz.timezone(timezone or default_timezone)).strftime('%Y-%m-%d')
+            slots_by_date.setdefault(local_date, []).append((timezone, hour))
+        logger.info(f"Starting the {wave_at:%H:00} UTC delivery wave for {len(slots)} timezone slots")
+        snapshot = snapshot or await self.fresh_snapshot()
+        for local_date, date_slots in slots_by_date.items():
+            if hasattr(self.subscribers, 'iter_slot_emails'):
+                recipients = self.subscribers.iter_slot_emails(date_slots)
+            else:
+                recipients = iter(self.subscribers)
+            await self.send_newsletter(snapshot, recipients, run_date=local_date)
 
-            server.quit()
-            logger.info("Completed sending newsletters")
+    async def run_scheduler(self):
+        """
+        Deliver until cancelled, warming the sources beforehand: to everyone at NEWSLETTER_TIME,
+        or in hourly per-timezone waves when DELIVERY_MODE is 'waves'.
+        """
+        if DELIVERY_MODE != 'waves':
+            schedule_time = os.getenv('NEWSLETTER_TIME', '09:00')
+            self.scheduler = DailyScheduler(schedule_time, self.send_newsletter,
+                                            prefetch=self.fetch_source_snapshot, prefetch_lead=PREFETCH_LEAD)
+            logger.info(f"Newsletter scheduled for {schedule_time} daily, prefetching {PREFETCH_LEAD:.0f}s earlier")
+        else:
+            self.scheduler = HourlyScheduler(self.send_wave, prefetch=self.prefetch_wave, prefetch_lead=PREFETCH_LEAD)
+            logger.info(f"Newsletter delivered in hourly waves at each subscriber's local hour, "
+                        f"prefetching {PREFETCH_LEAD:.0f}s earlier")
+        await self.scheduler.run_forever()
 
-        except Exception as e:
-            logger.error(f"Error in SMTP connection: {e}")
     async def start(self):
-        """Initialize and start the aggregator."""
+        """
+        Initialize and start the aggregator.
+        Runs until cancelled, so it can be awaited directly or run as a task in the API's lifespan.
+        """
         try:
             # Initialize aiohttp session
             await self.initialize_session()
 
-            # Start the health server
-            self.start_health_server()
-
-            # Schedule newsletter to be sent daily at specified time
-            schedule_time = os.getenv('NEWSLETTER_TIME', '09:00')
-            schedule.every().day.at(schedule_time).do(
-                lambda: asyncio.create_task(self.send_newsletter())
-            )
-
-            logger.info(f"Newsletter scheduled for {schedule_time} daily")
+            # Pick up signups and preference changes made through the API process
+            self.subscriber_watcher = asyncio.create_task(self.watch_subscribers())
 
-            # Keep the script running and handle schedules
-            while True:
-                schedule.run_pending()
-                await asyncio.sleep(60)
+            # In the background, so retry back-offs of a resumed run do not hold up the schedule
+            self.resume_task = asyncio.create_task(self.resume_unfinished_runs())
+            await self.run_scheduler()
 
         except Exception as e:
             logger.error(f"Error in start: {e}")
         finally:
+            if self.subscriber_watcher:
+                self.subscriber_watcher.cancel()
+            if self.resume_task:
+                self.resume_task.cancel()
             await self.close_session()
 
 async def main():
@@ -1232,8 +2026,9 @@ async def main():
         if not aggregator.subscribers:
             logger.info("No subscribers found.")
             return
+        snapshot = await aggregator.fetch_source_snapshot()
         for email in aggregator.subscribers.keys():
-            news = await aggregator.fetch_all_sources(email)
+            news = await aggregator.fetch_all_sources(email, snapshot)
             print(f"News for {email}:")
             print(news)
     except Exception as e:
@@ -1241,4 +2036,5 @@ async def main():
 
 
 if __name__ == "__main__":
+    configure_logging()
     asyncio.run(main())
\ No newline at end of file
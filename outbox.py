@@ -0,0 +1,213 @@
+import logging
+import os
+import sqlite3
+import time
+from typing import Dict, Iterable, Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+OUTBOX_DB = os.getenv('OUTBOX_DB', 'outbox.db')
+SEND_MAX_ATTEMPTS = int(os.getenv('SEND_MAX_ATTEMPTS', '5'))
+SEND_RETRY_BACKOFF = float(os.getenv('SEND_RETRY_BACKOFF', '30'))  # seconds before the first retry, doubled after
+# Outbox rows untouched for this many days are deleted, along with any run that never finished
+OUTBOX_RETENTION_DAYS = int(os.getenv('OUTBOX_RETENTION_DAYS', '14'))
+
+
+class SendLedger:
+    """
+    Durable record of every (run date, email) delivery so a restarted run only sends what is left.
+    Rows start ``queued``, become ``sent`` once the SMTP server accepts the message, and end up
+    ``failed`` after a permanent error or ``max_attempts`` transient ones. Transient failures stay
+    queued with an exponential backoff before the next attempt.
+    """
+
+    def __init__(self, path: str = OUTBOX_DB, max_attempts: int = SEND_MAX_ATTEMPTS,
+                 backoff: float = SEND_RETRY_BACKOFF, retention_days: int = OUTBOX_RETENTION_DAYS):
+        self.path = path
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.retention_days = retention_days
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS outbox (
+                run_date TEXT NOT NULL,
+                email TEXT NOT NULL,
+                state TEXT NOT NULL DEFAULT 'queued',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                next_attempt_at REAL NOT NULL DEFAULT 0,
+                last_error TEXT,
+                updated_at REAL NOT NULL,
+                PRIMARY KEY (run_date, email)
+            )
+        ''')
+        self.conn.execute('CREATE INDEX IF NOT EXISTS outbox_pending ON outbox (run_date, state, next_attempt_at)')
+        self.conn.execute('CREATE INDEX IF NOT EXISTS outbox_updated ON outbox (updated_at)')
+        self.conn.commit()
+
+    def enqueue(self, run_date: str, emails: Iterable[str]) -> int:
+        """Queue recipients for a run; recipients already in the ledger keep their state."""
+        now = time.time()
+        with self.conn:
+            cursor = self.conn.executemany(
+                'INSERT OR IGNORE INTO outbox (run_date, email, updated_at) VALUES (?, ?, ?)',
+                ((run_date, email, now) for email in emails)
+            )
+        return cursor.rowcount
+
+    def pending(self, run_date: str) -> List[str]:
+        """Return queued recipients whose next attempt is due."""
+        return [email for batch in self.iter_pending(run_date) for email in batch]
+
+    def iter_pending(self, run_date: str, batch_size: int = 500) -> Iterator[List[str]]:
+        """Yield due recipients a page at a time, in email order, so large runs never hold the full list."""
+        last_email = ''
+        now = time.time()
+        while True:
+            rows = self.conn.execute(
+                "SELECT email FROM outbox WHERE run_date = ? AND state = 'queued' AND next_attempt_at <= ? "
+                "AND email > ? ORDER BY email LIMIT ?",
+                (run_date, now, last_email, batch_size)
+            ).fetchall()
+            if not rows:
+                return
+            yield [email for (email,) in rows]
+            last_email = rows[-1][0]
+
+    def has_pending(self, run_date: str) -> bool:
+        """Whether any queued recipient is due now."""
+        return self.conn.execute(
+            "SELECT 1 FROM outbox WHERE run_date = ? AND state = 'queued' AND next_attempt_at <= ? LIMIT 1",
+            (run_date, time.time())
+        ).fetchone() is not None
+
+    def next_retry_at(self, run_date: str) -> Optional[float]:
+        """Return when the earliest backed-off recipient becomes due, if any are waiting."""
+        (next_at,) = self.conn.execute(
+            "SELECT MIN(next_attempt_at) FROM outbox WHERE run_date = ? AND state = 'queued'", (run_date,)
+        ).fetchone()
+        return next_at
+
+    def mark_sent(self, run_date: str, email: str):
+        """Record that the SMTP server accepted the message."""
+        with self.conn:
+            self.conn.execute(
+                "UPDATE outbox SET state = 'sent', attempts = attempts + 1, last_error = NULL, updated_at = ? "
+                "WHERE run_date = ? AND email = ?",
+                (time.time(), run_date, email)
+            )
+
+    def mark_failed(self, run_date: str, email: str, error: Exception, transient: bool):
+        """Record a failed attempt, scheduling a retry with backoff when the error is transient."""
+        (attempts,) = self.conn.execute(
+            'SELECT attempts FROM outbox WHERE run_date = ? AND email = ?', (run_date, email)
+        ).fetchone() or (0,)
+        attempts += 1
+        now = time.time()
+        if transient and attempts < self.max_attempts:
+            state, next_attempt_at = 'queued', now + self.backoff * 2 ** (attempts - 1)
+        else:
+            state, next_attempt_at = 'failed', now
+        with self.conn:
+            self.conn.execute(
+                'UPDATE outbox SET state = ?, attempts = ?, next_attempt_at = ?, last_error = ?, updated_at = ? '
+                'WHERE run_date = ? AND email = ?',
+                (state, attempts, next_attempt_at, str(error)[:500], now, run_date, email)
+            )
+
+    def unfinished_runs(self) -> List[str]:
+        """Return the runs that still have queued recipients, oldest first, e.g. after a crash mid-run."""
+        rows = self.conn.execute("SELECT DISTINCT run_date FROM outbox WHERE state = 'queued' ORDER BY run_date")
+        return [run_date for (run_date,) in rows]
+
+    def expire_runs(self, keep: Iterable[str]) -> int:
+        """Fail the queued recipients of every run not in ``keep``, so stale runs are never resumed."""
+        keep = list(keep)
+        placeholders = ', '.join('?' * len(keep))
+        with self.conn:
+            expired = self.conn.execute(
+                f"UPDATE outbox SET state = 'failed', last_error = 'expired', updated_at = ? "
+                f"WHERE state = 'queued' AND run_date NOT IN ({placeholders})",
+                (time.time(), *keep)
+            ).rowcount
+        if expired:
+            logger.info(f"Expired {expired} queued outbox rows from earlier runs")
+        return expired
+
+    def prune(self) -> int:
+        """Delete rows not updated within ``retention_days``, so the outbox does not grow with every run."""
+        with self.conn:
+            deleted = self.conn.execute('DELETE FROM outbox WHERE updated_at < ?',
+                                        (time.time() - self.retention_days * 86400,)).rowcount
+        if deleted:
+            logger.info(f"Pruned {deleted} outbox rows older than {self.retention_days} days")
+        return deleted
+
+    def last_run(self) -> Optional[Dict]:
+        """Return the most recently active run with its per-state counts, or None before the first run."""
+        row = self.conn.execute('SELECT run_date, updated_at FROM outbox ORDER BY updated_at DESC LIMIT 1').fetchone()
+        if row is None:
+            return None
+        run_date, updated_at = row
+        return {'run_date': run_date, 'summary': self.summary(run_date),
+                'updated_at': time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(updated_at))}
+
+    def summary(self, run_date: str) -> Dict[str, int]:
+        """Count a run's recipients by state."""
+        rows = self.conn.execute('SELECT state, COUNT(*) FROM outbox WHERE run_date = ? GROUP BY state', (run_date,))
+        return dict(rows.fetchall())
+
+    def close(self):
+        """Close the ledger's database connection."""
+        self.conn.close()
+
+
+class SourceHealthLog:
+    """
+    Last fetch attempt and success per source, kept next to the outbox so the API process can report
+    what a separate scheduler process saw.
+    """
+
+    def __init__(self, path: str = OUTBOX_DB):
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS source_health (
+                fetch_key TEXT PRIMARY KEY,
+                last_attempt TEXT NOT NULL,
+                last_success TEXT,
+                articles INTEGER NOT NULL DEFAULT 0,
+                last_error TEXT
+            )
+        ''')
+        self.conn.commit()
+
+    def record(self, fetch_key: str, attempted_at: str, articles: int, succeeded: bool,
+               error: Optional[str] = None):
+        """Record one fetch attempt; the last success and last error are kept until replaced."""
+        with self.conn:
+            self.conn.execute(
+                'INSERT INTO source_health (fetch_key, last_attempt, last_success, articles, last_error) '
+                'VALUES (?, ?, ?, ?, ?) ON CONFLICT (fetch_key) DO UPDATE SET '
+                'last_attempt = excluded.last_attempt, articles = excluded.articles, '
+                'last_success = COALESCE(excluded.last_success, last_success), '
+                'last_error = COALESCE(excluded.last_error, last_error)',
+                (fetch_key, attempted_at, attempted_at if succeeded else None, articles, error)
+            )
+
+    def all(self) -> Dict[str, Dict]:
+        """Return every source's entry, leaving out fields it never had."""
+        rows = self.conn.execute(
+            'SELECT fetch_key, last_attempt, last_success, articles, last_error FROM source_health ORDER BY fetch_key'
+        )
+        health = {}
+        for fetch_key, last_attempt, last_success, articles, last_error in rows:
+            entry = {'last_attempt': last_attempt, 'articles': articles,
+                     'last_success': last_success, 'last_error': last_error}
+            health[fetch_key] = {key: value for key, value in entry.items() if value is not None}
+        return health
+
+    def close(self):
+        """Close the log's database connection."""
+        self.conn.close()
@@ -0,0 +1,182 @@
+import logging
+import os
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Articles kept per newsletter after ranking (0 keeps all), and at most this many from one source (0: no cap)
+RANK_TOP_K = int(os.getenv('RANK_TOP_K', '30'))
+RANK_MAX_PER_SOURCE = int(os.getenv('RANK_MAX_PER_SOURCE', '8'))
+# Hours after which an article's recency boost halves
+RANK_HALF_LIFE_HOURS = float(os.getenv('RANK_HALF_LIFE_HOURS', '24'))
+# Engagement fields read from articles and their weights. Each is log-scaled and standardized within its
+# source, so a typical Hacker News story and a typical Stack Exchange question contribute alike.
+ENGAGEMENT_FEATURES = (('points', 1.0), ('comments', 0.5), ('star_velocity', 1.0))
+RECENCY_WEIGHT = 1.5
+# Per log-unit of other sources that carried the same story
+COVERAGE_WEIGHT = 1.0
+
+RankKey = Tuple[str, str]
+
+
+def rank_key(article: Dict) -> RankKey:
+    return article.get('source') or '', article.get('url') or article.get('title') or ''
+
+
+def published_timestamp(value: Any) -> Optional[float]:
+    """Read a publish time given as epoch seconds or an ISO 8601 string; None when missing or unparsable."""
+    if value is None or value == '':
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    try:
+        return datetime.fromisoformat(str(value).replace('Z', '+00:00')).timestamp()
+    except ValueError:
+        return None
+
+
+def score_articles(articles: List[Dict], coverage: Optional[List[int]] = None, now: Optional[float] = None,
+                   half_life_hours: float = RANK_HALF_LIFE_HOURS):
+    """
+    Score every article in one vectorized pass. Returns the scores and each article's source id as NumPy
+    arrays, plus the source name to id mapping. Missing signals count as average for their source; articles
+    without a publish time get half the recency boost. ``coverage`` counts other sources carrying each story.
+    """
+    import numpy as np
+
+    count = len(articles)
+    sources: Dict[str, int] = {}
+    source_index = np.fromiter((sources.setdefault(article.get('source') or '', len(sources))
+                                for article in articles), dtype=np.intp, count=count)
+    if not count:
+        return np.zeros(0), source_index, sources
+
+    raw = np.array([[article.get(field) for field, _ in ENGAGEMENT_FEATURES] for article in articles], dtype=float)
+    values = np.log1p(np.clip(raw, 0, None))
+    present = ~np.isnan(values)
+    filled = np.where(present, values, 0.0)
+
+    # Per-source mean and standard deviation of each feature, over the articles that have it
+    shape = (len(sources), len(ENGAGEMENT_FEATURES))
+    totals, squares, counts = np.zeros(shape), np.zeros(shape), np.zeros(shape)
+    np.add.at(totals, source_index, filled)
+    np.add.at(squares, source_index, filled ** 2)
+    np.add.at(counts, source_index, present)
+    counts = np.maximum(counts, 1)
+    mean = totals / counts
+    std = np.sqrt(np.maximum(squares / counts - mean ** 2, 0))[source_index]
+    spread = present & (std > 1e-9)
+    z = np.where(spread, (filled - mean[source_index]) / np.where(spread, std, 1), 0.0)
+    engagement = z @ np.array([weight for _, weight in ENGAGEMENT_FEATURES])
+
+    published = np.array([published_timestamp(article.get('published')) for article in articles], dtype=float)
+    age_hours = np.maximum((now or time.time()) - published, 0) / 3600
+    recency = np.where(np.isnan(published), 0.5, 0.5 ** (age_hours / half_life_hours))
+
+    scores = engagement + RECENCY_WEIGHT * recency
+    if coverage is not None:
+        scores += COVERAGE_WEIGHT * np.log1p(np.asarray(coverage, dtype=float))
+    return scores, source_index, sources
+
+
+class ArticleRanker:
+    """
+    Rank a snapshot's candidate articles across sources and pick each newsletter's top-K from them.
+    The whole snapshot is scored once, so engagement is standardized over the full pool, and duplicate
+    clusters are found once over the same pool; each extra source carrying a story adds to its score.
+    A preference group then only masks the globally sorted pool down to its sources and keeps the best
+    member of each duplicate cluster, all as array operations however many groups a run has.
+    """
+
+    def __init__(self, deduplicator=None, top_k: int = RANK_TOP_K, max_per_source: int = RANK_MAX_PER_SOURCE):
+        self.deduplicator = deduplicator
+        self.top_k = top_k
+        self.max_per_source = max_per_source
+        self.scored_snapshot: Optional[Dict[str, List[Dict]]] = None
+        self.pool: List[Dict] = []
+        self.source_ids: Dict[str, int] = {}
+        self.order = None  # pool indices, best first
+        self.ranked_sources = None  # source id of each entry in ``order``
+        self.ranked_clusters = None  # duplicate cluster of each entry in ``order``
+        self.last_score_ms = 0.0
+
+    def score_snapshot(self, snapshot: Dict[str, List[Dict]]):
+        """Score and cluster every article in ``snapshot``, reusing the result while the same snapshot is passed in."""
+        import numpy as np
+
+        if snapshot is self.scored_snapshot:
+            return
+        started = time.perf_counter()
+        pool = list({rank_key(article): article for articles in snapshot.values() for article in articles}.values())
+        if self.deduplicator is not None:
+            clusters = self.deduplicator.clusters(pool)
+        else:
+            clusters = list(range(len(pool)))
+
+        # Coverage: how many other sources carry the same story
+        cluster_sources: Dict[int, set] = {}
+        for index, root in enumerate(clusters):
+            cluster_sources.setdefault(root, set()).add(pool[index].get('source'))
+        coverage = [len(cluster_sources[root]) - 1 for root in clusters]
+
+        scores, source_index, self.source_ids = score_articles(pool, coverage=coverage)
+        self.order = np.argsort(-scores, kind='stable')
+        self.ranked_sources = source_index[self.order]
+        self.ranked_clusters = np.asarray(clusters, dtype=np.intp)[self.order]
+        self.pool = pool
+        self.scored_snapshot = snapshot
+        self.last_score_ms = round((time.perf_counter() - started) * 1000, 2)
+        logger.info(f"Scored {len(pool)} candidate articles in {self.last_score_ms}ms")
+
+    def candidates(self, snapshot: Dict[str, List[Dict]], sources: Iterable[str]) -> List[Dict]:
+        """
+        Return the articles of ``sources`` in ``snapshot``, best first, with duplicate stories collapsed into
+        their best-scored member; kept articles that absorbed others are copies listing those sources as ``also_on``.
+        """
+        import numpy as np
+
+        self.score_snapshot(snapshot)
+        wanted = np.zeros(len(self.source_ids), dtype=bool)
+        wanted[[self.source_ids[source] for source in sources if source in self.source_ids]] = True
+        selected = np.flatnonzero(wanted[self.ranked_sources])
+        clusters = self.ranked_clusters[selected]
+        _, first = np.unique(clusters, return_index=True)
+        first.sort()
+        kept = selected[first]
+
+        articles = [self.pool[index] for index in self.order[kept].tolist()]
+        if len(first) < len(selected):
+            # Only clusters with several members in this selection need their other sources listed
+            members: Dict[int, List[str]] = {}
+            duplicates = np.setdiff1d(np.arange(len(selected)), first, assume_unique=True)
+            for position in duplicates:
+                members.setdefault(int(clusters[position]), []).append(
+                    self.pool[int(self.order[selected[position]])].get('source'))
+            for position, cluster in enumerate(self.ranked_clusters[kept].tolist()):
+                if cluster in members:
+                    article = articles[position]
+                    also_on = [source for source in dict.fromkeys(members[cluster]) if source != article.get('source')]
+                    if also_on:
+                        articles[position] = {**article, 'also_on': also_on}
+        return articles
+
+    def top(self, articles: List[Dict], skip: Optional[Callable[[Dict], bool]] = None) -> List[Dict]:
+        """
+        Take ranked ``articles`` in order until ``top_k`` are chosen, at most ``max_per_source`` from one source,
+        leaving out those ``skip`` rejects. Stops as soon as the digest is full.
+        """
+        chosen = []
+        per_source: Dict[str, int] = {}
+        for article in articles:
+            source = article.get('source')
+            if self.max_per_source and per_source.get(source, 0) >= self.max_per_source:
+                continue
+            if skip is not None and skip(article):
+                continue
+            chosen.append(article)
+            per_source[source] = per_source.get(source, 0) + 1
+            if self.top_k and len(chosen) >= self.top_k:
+                break
+        return chosen
@@ -0,0 +1,155 @@
+import asyncio
+import logging
+from datetime import datetime, timedelta, tzinfo
+from typing import Any, Awaitable, Callable, Dict, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+# Longest single sleep; waits are re-checked against the wall clock so clock changes are picked up
+MAX_SLEEP = 3600
+
+
+def next_occurrence(at: str, now: Optional[datetime] = None) -> datetime:
+    """Return the next local datetime matching ``at`` (HH:MM), later than ``now``."""
+    hour, minute = (int(part) for part in at.split(':'))
+    now = now or datetime.now()
+    candidate = now.replace(hour=hour, minute=minute, second=0, microsecond=0)
+    if candidate <= now:
+        candidate += timedelta(days=1)
+    return candidate
+
+
+def next_hour(now: Optional[datetime] = None, minute: int = 0) -> datetime:
+    """Return the next local datetime at ``minute`` past an hour, later than ``now``."""
+    now = now or datetime.now()
+    candidate = now.replace(minute=minute, second=0, microsecond=0)
+    if candidate <= now:
+        candidate += timedelta(hours=1)
+    return candidate
+
+
+def local_hours_started(timezone: tzinfo, wave_at: datetime) -> Set[int]:
+    """
+    Return the local hours in ``timezone`` that began during the hour ending at ``wave_at`` (aware).
+    Usually one hour; none when clocks fall back and repeat an hour, two when they spring forward
+    over one, so each subscriber's preferred hour is matched exactly once per local day.
+    """
+    start = (wave_at - timedelta(hours=1)).astimezone(timezone).replace(tzinfo=None)
+    end = wave_at.astimezone(timezone).replace(tzinfo=None)
+    hours = set()
+    boundary = start.replace(minute=0, second=0, microsecond=0) + timedelta(hours=1)
+    while boundary <= end:
+        hours.add(boundary.hour)
+        boundary += timedelta(hours=1)
+    return hours
+
+
+async def sleep_until(when: datetime):
+    """Sleep until the wall clock reaches ``when``."""
+    while True:
+        remaining = (when - datetime.now()).total_seconds()
+        if remaining <= 0:
+            return
+        await asyncio.sleep(min(remaining, MAX_SLEEP))
+
+
+class DailyScheduler:
+    """
+    Run a coroutine job once a day at a fixed local time, sleeping until each trigger instead of polling.
+    An optional ``prefetch`` coroutine runs ``prefetch_lead`` seconds earlier and its result is passed
+    to the job, so slow preparation such as fetching sources happens before the scheduled time.
+    At most one run is in flight; a trigger that arrives while the previous run is still going is skipped.
+    """
+
+    def __init__(self, at: str, job: Callable[[Any], Awaitable[Any]],
+                 prefetch: Optional[Callable[[], Awaitable[Any]]] = None, prefetch_lead: float = 300):
+        self.at = at
+        self.job = job
+        self.prefetch = prefetch
+        self.prefetch_lead = prefetch_lead if prefetch else 0
+        self.next_run_at: Optional[datetime] = None
+        self.last_run_started: Optional[datetime] = None
+        self.last_run_finished: Optional[datetime] = None
+        self.current_run: Optional[asyncio.Task] = None
+        self.skipped = 0
+
+    def next_trigger(self, now: Optional[datetime] = None) -> datetime:
+        """Return when the job should next run."""
+        return next_occurrence(self.at, now)
+
+    @property
+    def running(self) -> bool:
+        return self.current_run is not None and not self.current_run.done()
+
+    async def _prefetch(self) -> Any:
+        try:
+            started = datetime.now()
+            result = await self.prefetch()
+            logger.info(f"Prefetch finished in {(datetime.now() - started).total_seconds():.1f}s")
+            return result
+        except Exception as e:
+            # The job falls back to doing its own preparation
+            logger.error(f"Error in scheduled prefetch: {e}")
+            return None
+
+    async def _run(self, prepared: Any):
+        self.last_run_started = datetime.now()
+        try:
+            await self.job(prepared)
+        except Exception as e:
+            logger.error(f"Error in scheduled run: {e}")
+        finally:
+            self.last_run_finished = datetime.now()
+
+    def trigger(self, prepared: Any = None) -> Optional[asyncio.Task]:
+        """Start a run now unless one is already in flight; returns the run's task, or None if skipped."""
+        if self.running:
+            self.skipped += 1
+            logger.warning(f"Previous run started at {self.last_run_started} is still going; skipping this one")
+            return None
+        self.current_run = asyncio.create_task(self._run(prepared))
+        return self.current_run
+
+    async def run_forever(self):
+        """Wait for each trigger in turn until cancelled; an in-flight run is cancelled with it."""
+        try:
+            while True:
+                self.next_run_at = self.next_trigger()
+                logger.info(f"Next run scheduled for {self.next_run_at}")
+
+                prepared = None
+                if self.prefetch_lead:
+                    prefetch_at = self.next_run_at - timedelta(seconds=self.prefetch_lead)
+                    if prefetch_at > datetime.now() and not self.running:
+                        await sleep_until(prefetch_at)
+                        prepared = await self._prefetch()
+
+                await sleep_until(self.next_run_at)
+                self.trigger(prepared)
+        finally:
+            if self.running:
+                self.current_run.cancel()
+
+    def status(self) -> Dict[str, Any]:
+        """Report the schedule for health checks."""
+        return {
+            'at': self.at,
+            'next_run_at': self.next_run_at.strftime("%Y-%m-%d %H:%M:%S") if self.next_run_at else None,
+            'running': self.running,
+            'last_run_started': self.last_run_started.strftime("%Y-%m-%d %H:%M:%S") if self.last_run_started else None,
+            'last_run_finished': (self.last_run_finished.strftime("%Y-%m-%d %H:%M:%S")
+                                  if self.last_run_finished else None),
+            'skipped': self.skipped
+        }
+
+
+class HourlyScheduler(DailyScheduler):
+    """Run a job at ``minute`` past every hour, e.g. one delivery wave per hour."""
+
+    def __init__(self, job: Callable[[Any], Awaitable[Any]], minute: int = 0,
+                 prefetch: Optional[Callable[[], Awaitable[Any]]] = None, prefetch_lead: float = 300):
+        super().__init__(f"*:{minute:02d}", job, prefetch, prefetch_lead)
+        self.minute = minute
+
+    def next_trigger(self, now: Optional[datetime] = None) -> datetime:
+        return next_hour(now, self.minute)
@@ -0,0 +1,448 @@
+import asyncio
+import contextlib
+import json
+import logging
+import os
+import sqlite3
+import tempfile
+import threading
+from collections.abc import MutableMapping
+from typing import AsyncIterator, Dict, Iterator, List, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows has no flock; writers there are only serialized within the process
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+SUBSCRIBERS_FILE = "subscribers.json"
+SUBSCRIBERS_DB = os.getenv('SUBSCRIBERS_DB', 'subscribers.db')
+# 'sqlite' (default) or 'json' for the legacy whole-file store
+SUBSCRIBER_STORE = os.getenv('SUBSCRIBER_STORE', 'sqlite')
+ITER_BATCH_SIZE = 1000
+# How often watchers poll the store version for changes made by other processes
+WATCH_INTERVAL = float(os.getenv('SUBSCRIBER_WATCH_INTERVAL', '1'))
+
+# Ids are AUTOINCREMENT so a deleted subscriber's id is never handed out again, and as the rowid alias
+# they survive a VACUUM; compact management tokens are indexed by them
+SUBSCRIBERS_TABLE = '''
+    CREATE TABLE IF NOT EXISTS subscribers (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        email TEXT NOT NULL UNIQUE,
+        source_mask INTEGER NOT NULL DEFAULT 0,
+        preferences TEXT NOT NULL DEFAULT '',
+        timezone TEXT NOT NULL DEFAULT '',
+        delivery_hour INTEGER
+    )
+'''
+
+# Bit positions for preferences stored as a bitmask. Append only: reordering would corrupt stored masks.
+KNOWN_PREFERENCES = (
+    'Hacker News', 'Reddit', 'Dev.to', 'Stack Exchange', 'GitHub Trending',
+    'The Verge', 'Wired', 'Ars Technica', 'VentureBeat', 'ZDNet',
+    'TechRadar', 'Hackernoon', 'Science Daily', 'Programming', 'Tech & AI'
+)
+PREFERENCE_BITS = {name: 1 << position for position, name in enumerate(KNOWN_PREFERENCES)}
+
+
+def encode_preferences(preferences: List[str]) -> Tuple[int, str]:
+    """Pack preferences into a bitmask over KNOWN_PREFERENCES plus a JSON list of any unknown names."""
+    mask = 0
+    extras = []
+    for preference in preferences:
+        bit = PREFERENCE_BITS.get(preference)
+        if bit is None:
+            extras.append(preference)
+        else:
+            mask |= bit
+    return mask, json.dumps(extras, ensure_ascii=False) if extras else ''
+
+
+def decode_preferences(mask: int, extras: str) -> List[str]:
+    """Inverse of encode_preferences; known preferences come back in KNOWN_PREFERENCES order."""
+    preferences = [name for name, bit in PREFERENCE_BITS.items() if mask & bit]
+    if extras:
+        preferences.extend(json.loads(extras))
+    return preferences
+
+
+async def watch_versions(store, interval: float = WATCH_INTERVAL) -> AsyncIterator[int]:
+    """Yield the store's version every time another writer (any process) changes it."""
+    last_version = store.version()
+    while True:
+        await asyncio.sleep(interval)
+        current = store.version()
+        if current != last_version:
+            last_version = current
+            yield current
+
+
+class SQLiteSubscriberStore(MutableMapping):
+    """
+    Subscriber store backed by SQLite in WAL mode, used like the old ``email: [preferences]`` dict.
+    Upserts and deletes touch a single row and commit atomically; iteration pages through the
+    table in batches instead of loading every subscriber into memory. Preferences are stored as a
+    bitmask over KNOWN_PREFERENCES, with unknown names kept as JSON next to it.
+    Every process reads the same database, and ``version()`` is a cheap counter bumped in the same
+    transaction as each write, so derived state can be cached until another process changes it.
+    Each thread gets its own connection, so reads on the event loop never see a transaction that a
+    worker thread, such as a buffered or bulk write, has not committed yet.
+    """
+
+    def __init__(self, path: str = SUBSCRIBERS_DB):
+        self.path = path
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._connections: List[sqlite3.Connection] = []
+        self._connections_lock = threading.Lock()
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        with self.conn:
+            self.conn.execute(SUBSCRIBERS_TABLE)
+            self.conn.execute('CREATE INDEX IF NOT EXISTS subscribers_slot ON subscribers (timezone, delivery_hour)')
+            self.conn.execute('CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)')
+            self.conn.execute('CREATE TABLE IF NOT EXISTS store_version (id INTEGER PRIMARY KEY, version INTEGER)')
+            self.conn.execute('INSERT OR IGNORE INTO store_version (id, version) VALUES (1, 0)')
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        """The calling thread's connection, opened on first use."""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            # Not bound to the thread, so a generator resumed on another thread can finish its cursor
+            conn = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+            with self._connections_lock:
+                self._connections.append(conn)
+        return conn
+
+    def _bump_version(self):
+        self.conn.execute('UPDATE store_version SET version = version + 1 WHERE id = 1')
+
+    def version(self) -> int:
+        """Return the store's change counter; it differs whenever any process has written since."""
+        return self.conn.execute('SELECT version FROM store_version WHERE id = 1').fetchone()[0]
+
+    def __getitem__(self, email: str) -> List[str]:
+        row = self.conn.execute('SELECT source_mask, preferences FROM subscribers WHERE email = ?',
+                                (email,)).fetchone()
+        if row is None:
+            raise KeyError(email)
+        return decode_preferences(*row)
+
+    def __setitem__(self, email: str, preferences: List[str]):
+        with self._lock, self.conn:
+            self.conn.execute(
+                'INSERT INTO subscribers (email, source_mask, preferences) VALUES (?, ?, ?) '
+                'ON CONFLICT(email) DO UPDATE SET source_mask = excluded.source_mask, '
+                'preferences = excluded.preferences',
+                (email, *encode_preferences(preferences))
+            )
+            self._bump_version()
+
+    def __delitem__(self, email: str):
+        with self._lock, self.conn:
+            cursor = self.conn.execute('DELETE FROM subscribers WHERE email = ?', (email,))
+            self._bump_version()
+        if not cursor.rowcount:
+            raise KeyError(email)
+
+    def __contains__(self, email: object) -> bool:
+        return self.conn.execute('SELECT 1 FROM subscribers WHERE email = ?', (email,)).fetchone() is not None
+
+    def __len__(self) -> int:
+        return self.conn.execute('SELECT COUNT(*) FROM subscribers').fetchone()[0]
+
+    def __iter__(self) -> Iterator[str]:
+        for email, _ in self.iter_batches_flat():
+            yield email
+
+    def items(self) -> Iterator[Tuple[str, List[str]]]:
+        """Stream (email, preferences) pairs without materializing the whole table."""
+        return self.iter_batches_flat()
+
+    def iter_batches(self, batch_size: int = ITER_BATCH_SIZE) -> Iterator[List[Tuple[str, List[str]]]]:
+        """Yield subscribers in email order, ``batch_size`` at a time, using keyset pagination."""
+        last_email = ''
+        while True:
+            rows = self.conn.execute(
+                'SELECT email, source_mask, preferences FROM subscribers WHERE email > ? ORDER BY email LIMIT ?',
+                (last_email, batch_size)
+            ).fetchall()
+            if not rows:
+                return
+            yield [(email, decode_preferences(mask, extras)) for email, mask, extras in rows]
+            last_email = rows[-1][0]
+
+    def iter_batches_flat(self, batch_size: int = ITER_BATCH_SIZE) -> Iterator[Tuple[str, List[str]]]:
+        """Stream subscribers one at a time while reading them from the table in batches."""
+        for batch in self.iter_batches(batch_size):
+            yield from batch
+
+    def iter_records(self, batch_size: int = ITER_BATCH_SIZE
+                     ) -> Iterator[List[Tuple[str, List[str], str, Optional[int]]]]:
+        """Like iter_batches, but each row also carries its (timezone, delivery hour) for exports."""
+        last_email = ''
+        while True:
+            rows = self.conn.execute(
+                'SELECT email, source_mask, preferences, timezone, delivery_hour FROM subscribers '
+                'WHERE email > ? ORDER BY email LIMIT ?',
+                (last_email, batch_size)
+            ).fetchall()
+            if not rows:
+                return
+            yield [(email, decode_preferences(mask, extras), timezone, delivery_hour)
+                   for email, mask, extras, timezone, delivery_hour in rows]
+            last_email = rows[-1][0]
+
+    def get_many(self, emails: List[str]) -> Dict[str, List[str]]:
+        """Look up preferences for a page of emails in one query; missing emails are left out."""
+        if not emails:
+            return {}
+        placeholders = ','.join('?' * len(emails))
+        rows = self.conn.execute(
+            f'SELECT email, source_mask, preferences FROM subscribers WHERE email IN ({placeholders})', emails
+        )
+        return {email: decode_preferences(mask, extras) for email, mask, extras in rows}
+
+    def subscriber_ids(self, emails: List[str]) -> Dict[str, int]:
+        """
+        Return the id of each existing email in one query. Ids index compact management tokens;
+        they are never renumbered or reused.
+        """
+        if not emails:
+            return {}
+        placeholders = ','.join('?' * len(emails))
+        rows = self.conn.execute(f'SELECT email, id FROM subscribers WHERE email IN ({placeholders})', emails)
+        return dict(rows.fetchall())
+
+    def email_for_id(self, subscriber_id: int) -> Optional[str]:
+        """Resolve a subscriber id from a compact token back to its email."""
+        row = self.conn.execute('SELECT email FROM subscribers WHERE id = ?', (subscriber_id,)).fetchone()
+        return row[0] if row else None
+
+    def set_delivery(self, email: str, timezone: str = '', delivery_hour: Optional[int] = None):
+        """Set when a subscriber wants mail; an empty timezone or missing hour falls back to the defaults."""
+        with self._lock, self.conn:
+            cursor = self.conn.execute('UPDATE subscribers SET timezone = ?, delivery_hour = ? WHERE email = ?',
+                                       (timezone or '', delivery_hour, email))
+            self._bump_version()
+        if not cursor.rowcount:
+            raise KeyError(email)
+
+    def get_delivery(self, email: str) -> Tuple[str, Optional[int]]:
+        """Return a subscriber's stored (timezone, delivery hour)."""
+        row = self.conn.execute('SELECT timezone, delivery_hour FROM subscribers WHERE email = ?', (email,)).fetchone()
+        if row is None:
+            raise KeyError(email)
+        return row
+
+    def delivery_slots(self) -> List[Tuple[str, Optional[int]]]:
+        """Return each distinct stored (timezone, delivery hour) pair."""
+        return self.conn.execute('SELECT DISTINCT timezone, delivery_hour FROM subscribers').fetchall()
+
+    def iter_slot_emails(self, slots: List[Tuple[str, Optional[int]]],
+                         batch_size: int = ITER_BATCH_SIZE) -> Iterator[str]:
+        """Stream the emails of subscribers in any of ``slots``, reading each slot in keyset-paged batches."""
+        for timezone, delivery_hour in slots:
+            last_email = ''
+            while True:
+                rows = self.conn.execute(
+                    'SELECT email FROM subscribers WHERE timezone = ? AND delivery_hour IS ? AND email > ? '
+                    'ORDER BY email LIMIT ?',
+                    (timezone, delivery_hour, last_email, batch_size)
+                ).fetchall()
+                if not rows:
+                    break
+                for (email,) in rows:
+                    yield email
+                last_email = rows[-1][0]
+
+    def distinct_preferences(self) -> Iterator[List[str]]:
+        """Yield each distinct preference set once, however many subscribers share it."""
+        for mask, extras in self.conn.execute('SELECT DISTINCT source_mask, preferences FROM subscribers'):
+            yield decode_preferences(mask, extras)
+
+    def upsert_many(self, subscribers: Dict[str, List[str]],
+                    delivery: Optional[Dict[str, Tuple[str, Optional[int]]]] = None) -> int:
+        """Insert or update many subscribers in one transaction, optionally setting their (timezone, hour)."""
+        with self._lock, self.conn:
+            self.conn.executemany(
+                'INSERT INTO subscribers (email, source_mask, preferences) VALUES (?, ?, ?) '
+                'ON CONFLICT(email) DO UPDATE SET source_mask = excluded.source_mask, '
+                'preferences = excluded.preferences',
+                ((email, *encode_preferences(preferences)) for email, preferences in subscribers.items())
+            )
+            if delivery:
+                self.conn.executemany(
+                    'UPDATE subscribers SET timezone = ?, delivery_hour = ? WHERE email = ?',
+                    ((timezone or '', hour, email) for email, (timezone, hour) in delivery.items())
+                )
+            self._bump_version()
+        return len(subscribers)
+
+    def get_meta(self, key: str) -> Optional[str]:
+        row = self.conn.execute('SELECT value FROM meta WHERE key = ?', (key,)).fetchone()
+        return row[0] if row else None
+
+    def set_meta(self, key: str, value: str):
+        with self._lock, self.conn:
+            self.conn.execute('INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)', (key, value))
+
+    def close(self):
+        with self._connections_lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections.clear()
+        self._local = threading.local()
+
+
+class JSONSubscriberStore(MutableMapping):
+    """
+    Legacy store keeping every subscriber in one JSON file, rewritten atomically on each change.
+    The file's mtime and size act as its version; reads reload it only when another process rewrote it.
+    Writes hold an exclusive lock on ``<path>.lock`` and re-read the file under it, so processes writing
+    at once apply their changes one after the other instead of overwriting each other.
+    """
+
+    def __init__(self, path: str = SUBSCRIBERS_FILE):
+        self.path = path
+        self._lock = threading.Lock()
+        self._loaded_version: Tuple[int, int] = (0, 0)
+        self._subscribers: Dict[str, List[str]] = {}
+        self._refresh()
+
+    def version(self) -> Tuple[int, int]:
+        """Return (mtime_ns, size) of the backing file, or zeros when it does not exist."""
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return 0, 0
+        return stat.st_mtime_ns, stat.st_size
+
+    def _refresh(self):
+        current = self.version()
+        if current != self._loaded_version:
+            self._subscribers = load_json_subscribers(self.path)
+            self._loaded_version = current
+
+    @property
+    def subscribers(self) -> Dict[str, List[str]]:
+        self._refresh()
+        return self._subscribers
+
+    def __getitem__(self, email: str) -> List[str]:
+        return self.subscribers[email]
+
+    @contextlib.contextmanager
+    def _writing(self) -> Iterator[Dict[str, List[str]]]:
+        """Yield the current subscribers for changing under the write lock, then save them."""
+        with self._lock, open(f"{self.path}.lock", 'a') as lock_file:
+            if fcntl is not None:
+                # Released when the lock file is closed
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            self._subscribers = load_json_subscribers(self.path)
+            self._loaded_version = self.version()
+            yield self._subscribers
+            self.save()
+
+    def __setitem__(self, email: str, preferences: List[str]):
+        with self._writing() as subscribers:
+            subscribers[email] = preferences
+
+    def __delitem__(self, email: str):
+        with self._writing() as subscribers:
+            del subscribers[email]
+
+    def __contains__(self, email: object) -> bool:
+        return email in self.subscribers
+
+    def __len__(self) -> int:
+        return len(self.subscribers)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(list(self.subscribers))
+
+    def iter_batches(self, batch_size: int = ITER_BATCH_SIZE) -> Iterator[List[Tuple[str, List[str]]]]:
+        """Yield subscribers in email order, ``batch_size`` at a time."""
+        items = sorted(self.subscribers.items())
+        for start in range(0, len(items), batch_size):
+            yield items[start:start + batch_size]
+
+    def get_many(self, emails: List[str]) -> Dict[str, List[str]]:
+        """Look up preferences for a page of emails; missing emails are left out."""
+        subscribers = self.subscribers
+        return {email: subscribers[email] for email in emails if email in subscribers}
+
+    def distinct_preferences(self) -> Iterator[List[str]]:
+        """Yield each distinct preference set once, however many subscribers share it."""
+        seen = set()
+        for preferences in self.subscribers.values():
+            key = tuple(preferences)
+            if key not in seen:
+                seen.add(key)
+                yield list(preferences)
+
+    def upsert_many(self, subscribers: Dict[str, List[str]],
+                    delivery: Optional[Dict[str, Tuple[str, Optional[int]]]] = None) -> int:
+        """Insert or update many subscribers with a single file rewrite; delivery slots are not kept here."""
+        with self._writing() as current:
+            current.update(subscribers)
+        return len(subscribers)
+
+    def save(self):
+        """
+        Write the file via a uniquely named temporary file and rename so readers never see a partial write.
+        Call it under ``_writing``, which holds the lock.
+        """
+        directory = os.path.dirname(os.path.abspath(self.path))
+        tmp_path = None
+        try:
+            with tempfile.NamedTemporaryFile('w', encoding='utf-8', dir=directory, prefix='.subscribers.',
+                                             suffix='.tmp', delete=False) as f:
+                tmp_path = f.name
+                f.write(json.dumps(self._subscribers, ensure_ascii=False, indent=4))
+            os.replace(tmp_path, self.path)
+        except Exception:
+            if tmp_path and os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        self._loaded_version = self.version()
+
+    def close(self):
+        pass
+
+
+def load_json_subscribers(path: str = SUBSCRIBERS_FILE) -> Dict[str, List[str]]:
+    """Read a legacy subscribers.json, treating a missing or empty file as no subscribers."""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            content = f.read()
+    except FileNotFoundError:
+        return {}
+    return json.loads(content) if content.strip() else {}
+
+
+def import_json_subscribers(store: SQLiteSubscriberStore, path: str = SUBSCRIBERS_FILE) -> int:
+    """
+    Import a legacy subscribers.json into the store once.
+    Later calls are no-ops, so the JSON file does not resurrect subscribers who unsubscribed since.
+    """
+    if store.get_meta('json_imported'):
+        return 0
+    subscribers = load_json_subscribers(path)
+    imported = store.upsert_many(subscribers) if subscribers else 0
+    store.set_meta('json_imported', path)
+    if imported:
+        logger.info(f"Imported {imported} subscribers from {path}")
+    return imported
+
+
+def create_subscriber_store(kind: str = SUBSCRIBER_STORE) -> MutableMapping:
+    """Open the configured subscriber store, importing the legacy JSON file into SQLite on first use."""
+    if kind == 'json':
+        return JSONSubscriberStore()
+    store = SQLiteSubscriberStore()
+    import_json_subscribers(store)
+    return store
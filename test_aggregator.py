@@ -1,66 +1,41 @@
 import argparse
-from main import TechNewsAggregator
-
-
-def test_fetch():
+import asyncio
+import logging
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from main import TechNewsAggregator, configure_logging
+
+
+async def fetch_sources():
     aggregator = TechNewsAggregator()
+    await aggregator.initialize_session()
 
     print("\n🔍 Testing news fetching from each source...\n")
 
-    print("Fetching from Hacker News...")
-    hn_news = aggregator.fetch_hacker_news()
-    print(f"✓ Found {len(hn_news)} stories\n")
-
-    print("Fetching from Reddit...")
-    reddit_news = aggregator.fetch_reddit()
-    print(f"✓ Found {len(reddit_news)} posts\n")
-
-    print("Fetching from Dev.to...")
-    dev_news = aggregator.fetch_dev_to()
-    print(f"✓ Found {len(dev_news)} articles\n")
-
-    print("Fetching from Stack Exchange...")
-    se_news = aggregator.fetch_stack_exchange()
-    print(f"✓ Found {len(se_news)} questions\n")
-
-    print("Fetching from github...")
-    ns = aggregator.fetch_github_trending()
-    print(f"{len(ns)}questions\n")
-
-    print("Fetching from news...")
-    nl = aggregator.fetch_newsapi_tech()
-    print(f"{len(nl)}questions\n")
-
-    print("Fetching from Ars Technica...")
-    ars_news = aggregator.fetch_ars_technica()
-    print(f"✓ Found {len(ars_news)} articles\n")
-
-    print("Fetching from VentureBeat...")
-    venture_news = aggregator.fetch_venture_beat()
-    print(f"✓ Found {len(venture_news)} articles\n")
+    results = {}
+    try:
+        for source, (fetch_key, fetcher) in aggregator.get_source_registry().items():
+            if fetch_key not in results:
+                print(f"Fetching from {fetch_key}...")
+                results[fetch_key] = await fetcher()
+            articles = [article for article in results[fetch_key] if fetch_key == source or article['source'] == source]
+            print(f"✓ Found {len(articles)} {source} articles\n")
+    finally:
+        await aggregator.close_session()
 
-    print("Fetching from ZDNet...")
-    zdnet_news = aggregator.fetch_zdnet()
-    print(f"✓ Found {len(zdnet_news)} articles\n")
-    print("Fetching from TechRadar...")
-    techradar_news = aggregator.fetch_tech_radar()
-    print(f"✓ Found {len(techradar_news)} articles\n")
+    return all(results.values())
 
 
-    print("Fetching from Hackernoon...")
-    hackernoon_news = aggregator.fetch_hackernoon()
-    print(f"✓ Found {len(hackernoon_news)} articles\n")
-
-    print("Fetching from Science...")
-    scince_news = aggregator.fetch_sciencedaily_rss()
-    print(f"✓ Found {len(hackernoon_news)} articles\n")
-
-    return all([hn_news, reddit_news, dev_news, se_news,nl,ns,venture_news,hackernoon_news,techradar_news,zdnet_news,scince_news])
-
-
-def preview_newsletter():
+async def preview_newsletter():
     aggregator = TechNewsAggregator()
-    content = aggregator.generate_newsletter()
+    try:
+        content = await aggregator.generate_newsletter('preview@example.com')
+    finally:
+        await aggregator.close_session()
 
     with open('newsletter_preview.html', 'w', encoding='utf-8') as f:
         f.write(content)
@@ -68,36 +43,219 @@ def preview_newsletter():
     print("\n✓ Newsletter preview saved to 'newsletter_preview.html'")
 
 
-def send_test_email(test_email):
+async def send_test_email(test_email):
     aggregator = TechNewsAggregator()
 
-    aggregator.add_subscriber(test_email)
+    subscribed = test_email in aggregator.subscribers
+    if not subscribed:
+        aggregator.add_subscriber(test_email)
 
     print(f"\n📧 Sending test newsletter to {test_email}...")
 
-    aggregator.send_newsletter()
-    aggregator.remove_subscriber(test_email)
+    try:
+        # Its own run date and no archive entries, so the real daily run is left untouched
+        await aggregator.send_newsletter(recipients=[test_email], run_date=f"test-{time.strftime('%Y%m%d%H%M%S')}",
+                                         record_articles=False)
+    finally:
+        if not subscribed:
+            aggregator.remove_subscriber(test_email)
+        await aggregator.close_session()
 
     print("✓ Test complete!")
 
 
+def benchmark_import(runs=5):
+    print(f"\n⏱️ Measuring cold import time over {runs} fresh interpreters...\n")
+    for module in ('main', 'app'):
+        timings = []
+        for _ in range(runs):
+            result = subprocess.run(
+                [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+                capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__))
+            )
+            # The last -X importtime line is the module itself; its cumulative column covers everything it pulled in
+            cumulative = int(result.stderr.strip().splitlines()[-1].split('|')[1])
+            timings.append(cumulative / 1000)
+        heavy = subprocess.run(
+            [sys.executable, '-c', f'import sys, {module}; '
+                                   f'print(sorted(m for m in ("aiohttp", "feedparser", "jwt", "fastapi", "numpy") '
+                                   f'if m in sys.modules))'],
+            capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__))
+        ).stdout.strip()
+        print(f"{module:>5}: median {statistics.median(timings):.1f}ms, best {min(timings):.1f}ms, "
+              f"heavy modules loaded: {heavy}")
+
+
+def benchmark_tokens(count=2000):
+    import main as aggregator_module
+    from subscriber_store import SQLiteSubscriberStore
+
+    # Tokens are refused without a signing key, so benchmark with a throwaway one unless one is configured
+    os.environ.setdefault('JWT_SECRET_KEY', 'benchmark-only-secret')
+    aggregator = TechNewsAggregator()
+    with tempfile.TemporaryDirectory() as tmp:
+        store = SQLiteSubscriberStore(os.path.join(tmp, 'subscribers.db'))
+        emails = [f"reader{i}@example.com" for i in range(count)]
+        store.upsert_many({email: ['Hacker News'] for email in emails})
+        aggregator.subscribers = store
+        aggregator.subscriber_manager.index = store
+
+        print(f"\n🔑 Minting and verifying management links for {count} subscribers...\n")
+        for token_format in ('jwt', 'compact'):
+            aggregator_module.TOKEN_FORMAT = token_format
+            manager = aggregator.subscriber_manager
+
+            started = time.perf_counter()
+            links = aggregator.get_management_links_batch(emails)
+            mint_time = time.perf_counter() - started
+
+            tokens = [link.split('token=', 1)[1] for pair in links.values() for link in pair.values()]
+            started = time.perf_counter()
+            for token in tokens:
+                manager.verified_tokens.clear()
+                manager.verify_token(token)
+            verify_time = time.perf_counter() - started
+
+            link_bytes = sum(len(link) for pair in links.values() for link in pair.values()) / count
+            print(f"{token_format:>8}: {link_bytes:.0f} link bytes per email, "
+                  f"{mint_time / count * 1e6:.1f}µs to mint per email, "
+                  f"{verify_time / len(tokens) * 1e6:.1f}µs to verify per token")
+        store.close()
+
+
+def benchmark_dedup(sizes=(500, 5000, 50000)):
+    import random
+    from dedup import ArticleDeduplicator
+
+    words = [f"word{i}" for i in range(5000)]
+    rng = random.Random(7)
+    print("\n🧹 Deduplicating synthetic article pools where about a third are reworded or re-tagged copies...\n")
+    for size in sizes:
+        articles = []
+        for i in range(size):
+            if articles and rng.random() < 0.33:
+                original = rng.choice(articles)
+                title = original['title'].split()
+                title[rng.randrange(len(title))] = rng.choice(words)  # one word changed
+                url = original['url'] + '?utm_source=feed' if rng.random() < 0.5 else f"https://example.com/copy/{i}"
+                articles.append({'title': ' '.join(title), 'url': url, 'source': 'Copy'})
+            else:
+                articles.append({'title': ' '.join(rng.sample(words, 8)), 'url': f"https://example.com/story/{i}",
+                                 'source': 'Original'})
+        deduplicator = ArticleDeduplicator()
+        started = time.perf_counter()
+        clusters = deduplicator.clusters(articles)
+        elapsed = time.perf_counter() - started
+        originals = sum(1 for article in articles if article['source'] == 'Original')
+        print(f"{size:>6} articles: {len(set(clusters))} stories ({originals} originals), "
+              f"{elapsed * 1000:.0f}ms, {elapsed / size * 1e6:.1f}µs per article")
+
+
+def benchmark_ranking(candidates=5000, groups=1000, sources_per_group=6):
+    import random
+    import numpy  # imported up front so its one-off import is not timed
+    from dedup import ArticleDeduplicator
+    from ranking import ArticleRanker
+
+    rng = random.Random(11)
+    now = time.time()
+    words = [f"word{i}" for i in range(5000)]
+    sources = [f"Source {i}" for i in range(40)]
+    snapshot = {source: [] for source in sources}
+    for i in range(candidates):
+        source = rng.choice(sources)
+        snapshot[source].append({
+            'title': ' '.join(rng.sample(words, 8)), 'url': f"https://example.com/{i}", 'source': source,
+            'points': rng.lognormvariate(3, 1.5) if rng.random() < 0.8 else None,
+            'comments': rng.randrange(200), 'published': now - rng.uniform(0, 72 * 3600)
+        })
+    group_sources = [rng.sample(sources, sources_per_group) for _ in range(groups)]
+
+    print(f"\n🏆 Ranking {candidates} candidates for {groups} preference groups of {sources_per_group} sources...\n")
+    ranker = ArticleRanker(ArticleDeduplicator())
+    started = time.perf_counter()
+    ranker.score_snapshot(snapshot)
+    score_time = time.perf_counter() - started
+
+    started = time.perf_counter()
+    for chosen in group_sources:
+        ranker.top(ranker.candidates(snapshot, chosen))
+    rank_time = time.perf_counter() - started
+    print(f"score and cluster all candidates once: {score_time * 1000:.1f}ms")
+    print(f"top-{ranker.top_k} for every group: {rank_time * 1000:.1f}ms ({rank_time / groups * 1e6:.0f}µs per group, "
+          f"~{candidates * sources_per_group // len(sources)} candidates each)")
+
+
+async def load_test_subscribe(count=3000):
+    os.environ.setdefault('RUN_SCHEDULER', 'false')
+    import httpx
+    import app as api
+
+    logging.getLogger('httpx').setLevel(logging.WARNING)
+    print(f"\n📈 Sending {count} concurrent signups through /subscribe...\n")
+    with tempfile.TemporaryDirectory() as tmp:
+        from subscriber_store import SQLiteSubscriberStore
+        from write_buffer import SubscriberWriteBuffer
+
+        aggregator = api.get_aggregator()
+        for buffered in (False, True):
+            store = SQLiteSubscriberStore(os.path.join(tmp, f'subscribers-{buffered}.db'))
+            aggregator.subscribers = store
+            aggregator.signup_buffer = SubscriberWriteBuffer(store)
+            api.SUBSCRIBE_WRITE_BUFFER = buffered
+
+            async def signup(client, i):
+                started = time.perf_counter()
+                response = await client.post('/subscribe', json={'email': f'reader{i}@example.com',
+                                                                 'preferences': ['Hacker News']})
+                response.raise_for_status()
+                return time.perf_counter() - started
+
+            transport = httpx.ASGITransport(app=api.app)
+            async with httpx.AsyncClient(transport=transport, base_url='http://test') as client:
+                started = time.perf_counter()
+                latencies = sorted(await asyncio.gather(*(signup(client, i) for i in range(count))))
+                elapsed = time.perf_counter() - started
+            await aggregator.signup_buffer.close()
+
+            p50 = latencies[len(latencies) // 2] * 1000
+            p99 = latencies[int(len(latencies) * 0.99) - 1] * 1000
+            print(f"{'buffered' if buffered else 'direct':>9}: p50 {p50:.1f}ms, p99 {p99:.1f}ms, "
+                  f"{count / elapsed:.0f} signups/s, {len(store)} stored, "
+                  f"{aggregator.signup_buffer.commits} group commits")
+            store.close()
+
+
 def main():
     parser = argparse.ArgumentParser(description='Test News Aggregator functionality')
-    parser.add_argument('--action', choices=['fetch', 'preview', 'send'],
+    parser.add_argument('--action', choices=['fetch', 'preview', 'send', 'bench-tokens', 'bench-import', 'bench-dedup',
+                                             'bench-rank', 'load-subscribe'],
                         default='fetch', help='Action to perform')
     parser.add_argument('--email', help='Email address for test sending')
 
     args = parser.parse_args()
 
+    configure_logging()
+
     if args.action == 'fetch':
-        test_fetch()
+        asyncio.run(fetch_sources())
     elif args.action == 'preview':
-        preview_newsletter()
+        asyncio.run(preview_newsletter())
     elif args.action == 'send':
         if not args.email:
             print("Error: Email address required for send action")
             return
-        send_test_email(args.email)
+        asyncio.run(send_test_email(args.email))
+    elif args.action == 'bench-tokens':
+        benchmark_tokens()
+    elif args.action == 'bench-import':
+        benchmark_import()
+    elif args.action == 'bench-dedup':
+        benchmark_dedup()
+    elif args.action == 'bench-rank':
+        benchmark_ranking()
+    elif args.action == 'load-subscribe':
+        asyncio.run(load_test_subscribe())
 
 
 if __name__ == "__main__":
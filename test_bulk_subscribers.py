@@ -0,0 +1,148 @@
+import io
+import json
+
+import pytest
+
+from bulk_subscribers import bulk_export, bulk_import, detect_format, parse_record
+from subscriber_store import SQLiteSubscriberStore
+
+
+def prepare(email, preferences=None, timezone=None, delivery_hour=None):
+    if '@' not in email:
+        raise ValueError("Invalid email format")
+    if delivery_hour is not None and not 0 <= delivery_hour <= 23:
+        raise ValueError("Delivery hour must be between 0 and 23")
+    return preferences or ['Hacker News']
+
+
+class FlakyStore(dict):
+    """Dict store whose upsert fails for any chunk containing ``poison``."""
+
+    def __init__(self, poison):
+        super().__init__()
+        self.poison = poison
+
+    def upsert_many(self, subscribers, delivery=None):
+        if self.poison in subscribers:
+            raise RuntimeError("database is locked")
+        self.update(subscribers)
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = SQLiteSubscriberStore(str(tmp_path / 'subscribers.db'))
+    yield store
+    store.close()
+
+
+def test_parse_record_defaults_and_errors():
+    assert parse_record({'email': ' a@b.com ', 'preferences': 'Reddit; Dev.to;', 'delivery_hour': '7'}) == \
+        ('a@b.com', ['Reddit', 'Dev.to'], None, 7)
+    assert parse_record({'email': 'a@b.com', 'preferences': '', 'timezone': ''}) == ('a@b.com', None, None, None)
+    with pytest.raises(ValueError):
+        parse_record({'email': ''})
+    with pytest.raises(ValueError):
+        parse_record({'email': 'a@b.com', 'delivery_hour': 'seven'})
+    with pytest.raises(ValueError):
+        parse_record({'email': 'a@b.com', 'preferences': [['Reddit']]})
+
+
+def test_detect_format():
+    assert detect_format('subscribers.ndjson') == 'ndjson'
+    assert detect_format('subscribers.jsonl') == 'ndjson'
+    assert detect_format('subscribers.CSV') == 'csv'
+    assert detect_format('-') == 'csv'
+
+
+def test_csv_import_reports_bad_rows_and_keeps_going(store):
+    lines = io.StringIO(
+        'email,preferences,timezone,delivery_hour\n'
+        'one@example.com,Reddit;Dev.to,Europe/Berlin,8\n'
+        'not-an-email,Reddit,,\n'
+        ',Reddit,,\n'
+        'two@example.com,,,25\n'
+        'three@example.com,,,\n'
+    )
+    report = bulk_import(store, lines, 'csv', prepare, chunk_size=2)
+
+    assert report['imported'] == 2
+    assert report['failed'] == 3
+    assert [error['row'] for error in report['errors']] == [3, 4, 5]
+    assert report['errors'][0]['email'] == 'not-an-email'
+    assert store['one@example.com'] == ['Reddit', 'Dev.to']
+    assert store['three@example.com'] == ['Hacker News']
+    assert ('Europe/Berlin', 8) in store.delivery_slots()
+
+
+def test_import_commits_in_chunks_and_coalesces_repeated_emails():
+    store = FlakyStore(poison=None)
+    lines = [json.dumps({'email': f'reader{i % 4}@example.com', 'preferences': [f'Source {i}']}) + '\n'
+             for i in range(6)]
+    report = bulk_import(store, lines, 'ndjson', prepare, chunk_size=3)
+
+    # The first chunk closes after three distinct emails; the second repeats two of them
+    assert report == {'imported': 6, 'failed': 0, 'chunks': 2, 'errors': []}
+    assert store['reader0@example.com'] == ['Source 4']
+
+    store = FlakyStore(poison=None)
+    report = bulk_import(store, lines, 'ndjson', prepare, chunk_size=10)
+    # Within one chunk the last row for an email wins
+    assert report == {'imported': 4, 'failed': 0, 'chunks': 1, 'errors': []}
+    assert store['reader0@example.com'] == ['Source 4']
+    assert store['reader2@example.com'] == ['Source 2']
+
+
+def test_failed_chunk_is_reported_without_aborting_the_import():
+    store = FlakyStore(poison='reader1@example.com')
+    lines = [json.dumps({'email': f'reader{i}@example.com'}) + '\n' for i in range(4)]
+    report = bulk_import(store, lines, 'ndjson', prepare, chunk_size=2)
+
+    assert report['imported'] == 2
+    assert report['failed'] == 2
+    assert {error['email'] for error in report['errors']} == {'reader0@example.com', 'reader1@example.com'}
+    assert set(store) == {'reader2@example.com', 'reader3@example.com'}
+
+
+def test_ndjson_import_reports_invalid_lines():
+    lines = ['{"email": "a@example.com"}\n', '{not json\n', '\n', '["a list"]\n', '{"email": "b@example.com"}\n']
+    report = bulk_import(FlakyStore(poison=None), lines, 'ndjson', prepare)
+
+    assert report['imported'] == 2
+    assert [error['row'] for error in report['errors']] == [2, 4]
+
+
+def test_rows_with_non_string_preferences_fail_alone(store):
+    lines = ['{"email": "a@example.com", "preferences": ["Reddit"]}\n',
+             '{"email": "b@example.com", "preferences": [["x"]]}\n',
+             '{"email": "c@example.com", "preferences": [{}]}\n']
+    report = bulk_import(store, lines, 'ndjson', prepare)
+
+    assert report['imported'] == 1
+    assert [error['row'] for error in report['errors']] == [2, 3]
+    assert store['a@example.com'] == ['Reddit']
+
+
+def test_error_list_is_capped_but_failures_are_counted():
+    lines = [json.dumps({'email': f'bad{i}'}) + '\n' for i in range(5)]
+    report = bulk_import(FlakyStore(poison=None), lines, 'ndjson', prepare, max_errors=2)
+
+    assert report['failed'] == 5
+    assert len(report['errors']) == 2
+
+
+def test_csv_without_email_column_is_rejected(store):
+    with pytest.raises(ValueError):
+        bulk_import(store, io.StringIO('address\nfoo@example.com\n'), 'csv', prepare)
+
+
+def test_export_round_trips_through_import(store, tmp_path):
+    store.upsert_many({'a@example.com': ['Reddit', 'Dev.to'], 'b@example.com': ['Hacker News']},
+                      {'a@example.com': ('Asia/Tokyo', 7)})
+    for fmt in ('csv', 'ndjson'):
+        exported = ''.join(bulk_export(store, fmt, batch_size=1))
+        copy = SQLiteSubscriberStore(str(tmp_path / f'copy-{fmt}.db'))
+        report = bulk_import(copy, io.StringIO(exported), fmt, prepare)
+        assert report['imported'] == 2
+        assert dict(copy.items()) == dict(store.items())
+        assert sorted(copy.delivery_slots(), key=str) == sorted(store.delivery_slots(), key=str)
+        copy.close()
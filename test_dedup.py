@@ -0,0 +1,64 @@
+from dedup import ArticleDeduplicator, article_url_key, canonicalize_url, jaccard, minhash, title_tokens
+
+
+def article(title, url, source='Hacker News', **fields):
+    return {'title': title, 'url': url, 'source': source, **fields}
+
+
+def test_canonicalize_url_drops_tracking_and_cosmetic_differences():
+    assert canonicalize_url('http://www.Example.com:443/post/?utm_source=rss&b=2&a=1#comments') == \
+        'https://example.com/post?a=1&b=2'
+    assert canonicalize_url('https://example.com/post?fbclid=abc') == canonicalize_url('https://example.com/post/')
+    assert canonicalize_url('https://example.com:8080/post') == 'https://example.com:8080/post'
+
+
+def test_article_url_key_follows_discussion_permalinks():
+    reddit = article('Post', 'https://www.reddit.com/r/programming/comments/1', 'Reddit',
+                     target_url='https://example.com/story?utm_medium=social')
+    assert article_url_key(reddit) == 'https://example.com/story'
+    # Other hosts keep their own URL even with a target
+    assert article_url_key(article('Post', 'https://dev.to/post', target_url='https://x.com')) == 'https://dev.to/post'
+    assert article_url_key({'title': 'No link'}) == ''
+
+
+def test_minhash_estimates_jaccard():
+    first = title_tokens('Rust compiler gets faster incremental builds in the latest release')
+    second = title_tokens('The Rust compiler gets faster incremental builds')
+    signature_first, signature_second = minhash(first), minhash(second)
+    estimate = sum(a == b for a, b in zip(signature_first, signature_second)) / len(signature_first)
+    assert abs(estimate - jaccard(first, second)) < 0.3
+    assert minhash(()) == ()
+
+
+def test_clusters_match_urls_and_near_duplicate_titles():
+    articles = [
+        article('Rust 2.0 released with a new borrow checker', 'https://blog.rust-lang.org/rust-2'),
+        article('Discussion thread', 'https://reddit.com/r/rust/comments/9', 'Reddit',
+                target_url='https://blog.rust-lang.org/rust-2/?utm_source=reddit'),
+        article('Rust 2.0 released, with a new borrow checker!', 'https://dev.to/someone/rust-2', 'Dev.to'),
+        article('Python 3.14 adds free-threading by default', 'https://python.org/314'),
+        article('Untitled', ''),
+        article('Untitled', ''),
+    ]
+    roots = ArticleDeduplicator().clusters(articles)
+
+    assert roots[:3] == [0, 0, 0]
+    assert roots[3] == 3
+    # Articles without a URL only match on their titles
+    assert roots[4:] == [4, 4]
+
+
+def test_clusters_keep_different_stories_apart():
+    articles = [article(f'Release notes for project number {i} are out', f'https://example.com/{i}')
+                for i in range(50)]
+    articles += [article('Kernel maintainers debate a new scheduler', 'https://example.com/kernel'),
+                 article('Browser vendors agree on a new storage API', 'https://example.com/storage')]
+    roots = ArticleDeduplicator(threshold=0.8).clusters(articles)
+    assert roots == list(range(len(articles)))
+
+
+def test_signatures_are_cached_and_bounded():
+    deduplicator = ArticleDeduplicator(cache_size=2)
+    for title in ('one story', 'two story', 'three story', 'two story'):
+        deduplicator.signature(title)
+    assert list(deduplicator.signatures) == ['three story', 'two story']
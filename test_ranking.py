@@ -0,0 +1,108 @@
+import time
+
+import pytest
+
+from dedup import ArticleDeduplicator
+from ranking import ArticleRanker, published_timestamp, score_articles
+
+NOW = time.time()
+
+
+def article(source, index, points=None, **fields):
+    return {'title': f'{source} story number {index} about unrelated topic {index * 7919}',
+            'url': f'https://example.com/{source}/{index}', 'source': source, 'points': points,
+            'published': NOW, **fields}
+
+
+def snapshot(**sources):
+    return {source: [article(source, index, points) for index, points in enumerate(points_list)]
+            for source, points_list in sources.items()}
+
+
+def test_published_timestamp_reads_epochs_and_iso_strings():
+    assert published_timestamp(1700000000) == 1700000000.0
+    assert published_timestamp('2023-11-14T22:13:20Z') == 1700000000.0
+    assert published_timestamp('yesterday') is None
+    assert published_timestamp('') is None
+
+
+def test_engagement_is_standardized_within_each_source():
+    # Reddit's scale is ten times larger, but the same spread within each source scores alike
+    articles = [article('Reddit', i, points) for i, points in enumerate((99, 999, 9999))]
+    articles += [article('Stack Exchange', i, points) for i, points in enumerate((9, 99, 999))]
+    scores, source_index, sources = score_articles(articles, now=NOW)
+
+    assert sources == {'Reddit': 0, 'Stack Exchange': 1}
+    assert source_index.tolist() == [0, 0, 0, 1, 1, 1]
+    assert scores[:3] == pytest.approx(scores[3:])
+    assert scores[0] < scores[1] < scores[2]
+
+
+def test_recency_and_coverage_raise_scores():
+    fresh, stale, undated = article('Dev.to', 0), article('Dev.to', 1), article('Dev.to', 2)
+    stale['published'] = NOW - 72 * 3600
+    undated['published'] = None
+    scores, _, _ = score_articles([fresh, stale, undated], now=NOW)
+    assert scores[0] > scores[2] > scores[1]
+
+    covered, _, _ = score_articles([fresh, fresh], coverage=[2, 0], now=NOW)
+    assert covered[0] > covered[1]
+
+
+def test_candidates_only_include_the_requested_sources_best_first():
+    ranker = ArticleRanker(top_k=0, max_per_source=0)
+    pool = snapshot(**{'Hacker News': [5, 500, 50], 'Reddit': [1, 2], 'Dev.to': [3]})
+    chosen = ranker.candidates(pool, ['Hacker News', 'Dev.to', 'Unknown'])
+
+    assert {item['source'] for item in chosen} == {'Hacker News', 'Dev.to'}
+    hacker_news = [item['points'] for item in chosen if item['source'] == 'Hacker News']
+    assert hacker_news == [500, 50, 5]
+
+
+def test_candidates_keep_the_best_copy_of_a_duplicate_story():
+    pool = snapshot(**{'Hacker News': [10, 20, 30], 'Reddit': [1, 2, 3]})
+    story = {'title': 'Rust 2.0 released with a new borrow checker', 'url': 'https://blog.rust-lang.org/2'}
+    pool['Hacker News'].append({**article('Hacker News', 9, 5000), **story})
+    pool['Reddit'].append({**article('Reddit', 9, 1, target_url=story['url']), **story,
+                           'url': 'https://reddit.com/r/rust/comments/2'})
+    ranker = ArticleRanker(ArticleDeduplicator())
+
+    both = ranker.candidates(pool, ['Hacker News', 'Reddit'])
+    copies = [item for item in both if item['title'] == story['title']]
+    assert len(copies) == 1
+    assert copies[0]['source'] == 'Hacker News'
+    assert copies[0]['also_on'] == ['Reddit']
+    # The snapshot's own article is left untouched
+    assert 'also_on' not in pool['Hacker News'][-1]
+
+    # A group without the best copy still gets the story from its own source
+    reddit_only = ranker.candidates(pool, ['Reddit'])
+    assert [item['source'] for item in reddit_only if item['title'] == story['title']] == ['Reddit']
+
+
+def test_snapshot_is_scored_once_per_identity():
+    ranker = ArticleRanker()
+    pool = snapshot(Reddit=[1, 2])
+    ranker.candidates(pool, ['Reddit'])
+    order = ranker.order
+    ranker.candidates(pool, ['Reddit'])
+    assert ranker.order is order
+    ranker.candidates(snapshot(Reddit=[1, 2]), ['Reddit'])
+    assert ranker.order is not order
+
+
+def test_top_caps_sources_and_stops_at_k():
+    ranker = ArticleRanker(top_k=5, max_per_source=2)
+    pool = snapshot(**{'Hacker News': [900, 800, 700, 600], 'Reddit': [90, 80, 70], 'Dev.to': [9]})
+    chosen = ranker.top(ranker.candidates(pool, pool))
+
+    assert len(chosen) == 5
+    counts = {source: sum(item['source'] == source for item in chosen) for source in pool}
+    assert counts == {'Hacker News': 2, 'Reddit': 2, 'Dev.to': 1}
+
+
+def test_top_leaves_out_skipped_articles():
+    ranker = ArticleRanker(top_k=2, max_per_source=0)
+    ranked = ranker.candidates(snapshot(Reddit=[30, 20, 10]), ['Reddit'])
+    chosen = ranker.top(ranked, skip=lambda item: item['points'] == 30)
+    assert [item['points'] for item in chosen] == [20, 10]
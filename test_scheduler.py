@@ -0,0 +1,60 @@
+from collections import Counter
+from datetime import datetime, timedelta
+
+import pytz
+
+from scheduler import local_hours_started, next_hour, next_occurrence
+
+NEW_YORK = pytz.timezone('America/New_York')
+
+
+def wave(year, month, day, hour):
+    return datetime(year, month, day, hour, tzinfo=pytz.UTC)
+
+
+def hours_over_local_day(timezone, local_day):
+    """Count how often each local hour is matched by the hourly waves covering ``local_day``."""
+    start = timezone.localize(local_day).astimezone(pytz.UTC)
+    end = timezone.localize(local_day + timedelta(days=1)).astimezone(pytz.UTC)
+    matched = Counter()
+    wave_at = start + timedelta(hours=1)
+    while wave_at <= end:
+        matched.update(local_hours_started(timezone, wave_at))
+        wave_at += timedelta(hours=1)
+    return matched
+
+
+def test_local_hours_started_on_an_ordinary_hour():
+    assert local_hours_started(NEW_YORK, wave(2026, 6, 1, 13)) == {9}
+    assert local_hours_started(pytz.UTC, wave(2026, 6, 1, 13)) == {13}
+
+
+def test_local_hours_started_with_a_half_hour_offset():
+    # 03:00-04:00 UTC is 08:30-09:30 in Kolkata, so only 09:00 begins in that wave
+    assert local_hours_started(pytz.timezone('Asia/Kolkata'), wave(2026, 6, 1, 4)) == {9}
+
+
+def test_spring_forward_matches_the_skipped_hour_with_the_next_one():
+    # 2026-03-08 02:00 EST jumps to 03:00 EDT at 07:00 UTC
+    assert local_hours_started(NEW_YORK, wave(2026, 3, 8, 7)) == {2, 3}
+    assert local_hours_started(NEW_YORK, wave(2026, 3, 8, 8)) == {4}
+
+
+def test_fall_back_does_not_match_the_repeated_hour_twice():
+    # 2026-11-01 02:00 EDT falls back to 01:00 EST at 06:00 UTC
+    assert local_hours_started(NEW_YORK, wave(2026, 11, 1, 5)) == {1}
+    assert local_hours_started(NEW_YORK, wave(2026, 11, 1, 6)) == set()
+    assert local_hours_started(NEW_YORK, wave(2026, 11, 1, 7)) == {2}
+
+
+def test_every_hour_matched_exactly_once_per_local_day():
+    for local_day in (datetime(2026, 3, 8), datetime(2026, 11, 1), datetime(2026, 6, 1)):
+        assert hours_over_local_day(NEW_YORK, local_day) == Counter(range(24))
+
+
+def test_next_occurrence_and_next_hour():
+    now = datetime(2026, 10, 18, 9, 30)
+    assert next_occurrence('10:00', now) == datetime(2026, 10, 18, 10, 0)
+    assert next_occurrence('09:30', now) == datetime(2026, 10, 19, 9, 30)
+    assert next_hour(now) == datetime(2026, 10, 18, 10, 0)
+    assert next_hour(now, minute=45) == datetime(2026, 10, 18, 9, 45)
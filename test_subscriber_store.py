@@ -0,0 +1,22 @@
+from subscriber_store import SQLiteSubscriberStore
+
+
+def test_subscriber_ids_survive_vacuum_and_are_never_reused(tmp_path):
+    store = SQLiteSubscriberStore(str(tmp_path / 'subscribers.db'))
+    store.upsert_many({f'reader{i}@example.com': ['Reddit'] for i in range(5)})
+    ids = store.subscriber_ids([f'reader{i}@example.com' for i in range(5)])
+
+    del store['reader1@example.com']
+    del store['reader4@example.com']
+    store.conn.execute('VACUUM')
+    store['reader1@example.com'] = ['Dev.to']
+
+    assert store.subscriber_ids(['reader2@example.com', 'reader3@example.com']) == {
+        'reader2@example.com': ids['reader2@example.com'], 'reader3@example.com': ids['reader3@example.com']}
+    assert store.subscriber_ids(['reader1@example.com'])['reader1@example.com'] > max(ids.values())
+    assert store.email_for_id(ids['reader4@example.com']) is None
+    # Preference updates keep the id
+    store['reader2@example.com'] = ['Hacker News']
+    assert store.email_for_id(ids['reader2@example.com']) == 'reader2@example.com'
+    store.close()
+
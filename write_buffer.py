@@ -0,0 +1,187 @@
+import asyncio
+import logging
+import os
+import time
+from typing import Dict, List, MutableMapping, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Pending signups are committed every SUBSCRIBE_FLUSH_INTERVAL seconds or once SUBSCRIBE_FLUSH_SIZE are waiting
+SUBSCRIBE_FLUSH_INTERVAL = float(os.getenv('SUBSCRIBE_FLUSH_INTERVAL', '0.05'))
+SUBSCRIBE_FLUSH_SIZE = int(os.getenv('SUBSCRIBE_FLUSH_SIZE', '500'))
+# Back-off after a failed commit before the batch is tried again
+SUBSCRIBE_RETRY_DELAY = 1.0
+# Signups the store rejected outright, kept for inspection; older ones are dropped past this many
+DEAD_LETTER_SIZE = 1000
+# Errors that mean the row itself is bad, so retrying it can never succeed
+REJECTED_ROW_ERRORS = (TypeError, ValueError)
+
+
+class SubscriberWriteBuffer:
+    """
+    In-memory write-ahead buffer for subscriber upserts, group-committed to the store off the event loop.
+    ``submit`` only records the write, so request handlers return without touching disk; a background task
+    commits everything pending in one transaction on a short interval or as soon as ``max_batch`` writes are
+    waiting. Writes for the same email coalesce, last one wins. Acknowledged writes that are still pending
+    are lost if the process dies before the next flush, which is the price of not waiting for disk.
+    """
+
+    def __init__(self, store: MutableMapping, interval: float = SUBSCRIBE_FLUSH_INTERVAL,
+                 max_batch: int = SUBSCRIBE_FLUSH_SIZE):
+        self.store = store
+        self.interval = interval
+        self.max_batch = max_batch
+        self._pending: Dict[str, Tuple[List[str], Optional[Tuple[str, Optional[int]]]]] = {}
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        # One commit at a time, so an older batch never lands after a newer one for the same email
+        self._flush_lock = asyncio.Lock()
+        self._closing = False
+        self._in_flight: Dict[str, Tuple[List[str], Optional[Tuple[str, Optional[int]]]]] = {}
+        # Emails removed while their batch was being committed, deleted again once it lands
+        self._discarded: set = set()
+        self.dead_letters: List[Tuple[str, str]] = []  # (email, error) of rejected signups
+        self.commits = 0
+        self.committed = 0
+        self.failures = 0
+        self.last_commit_ms = 0.0
+
+    def submit(self, email: str, preferences: List[str],
+               delivery: Optional[Tuple[str, Optional[int]]] = None):
+        """Queue an upsert and return immediately; it reaches the store with the next group commit."""
+        if delivery is None and email in self._pending:
+            # Like the store's upsert, a write without delivery settings leaves the earlier ones alone
+            delivery = self._pending[email][1]
+        self._pending[email] = (preferences, delivery)
+        if self._task is None or self._task.done():
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.get_running_loop().create_task(self.run())
+        # Wake the committer when it is idle and this is the first write, or when a batch is full
+        if len(self._pending) == 1 or len(self._pending) >= self.max_batch:
+            self._wakeup.set()
+
+    def has_pending(self, email: str) -> bool:
+        """Whether a write for ``email`` is waiting or being committed, and so not yet in the store."""
+        return email in self._pending or email in self._in_flight
+
+    def discard(self, email: str) -> bool:
+        """
+        Drop a write still waiting to be committed, so a direct change made after it, such as an
+        unsubscribe, is not overwritten by the next flush. Returns whether one was pending.
+        """
+        if email in self._in_flight:
+            self._discarded.add(email)
+        return self._pending.pop(email, None) is not None or email in self._in_flight
+
+    def _commit(self, batch: Dict[str, Tuple[List[str], Optional[Tuple[str, Optional[int]]]]]):
+        started = time.perf_counter()
+        preferences = {email: entry[0] for email, entry in batch.items()}
+        delivery = {email: entry[1] for email, entry in batch.items() if entry[1] is not None}
+        if hasattr(self.store, 'upsert_many'):
+            self.store.upsert_many(preferences, delivery)
+        else:
+            self.store.update(preferences)
+        self.last_commit_ms = round((time.perf_counter() - started) * 1000, 2)
+
+    def _commit_each(self, batch: Dict[str, Tuple[List[str], Optional[Tuple[str, Optional[int]]]]]):
+        """Commit ``batch`` row by row, dead-lettering rows the store rejects; returns rows worth retrying."""
+        retry = {}
+        for email, entry in batch.items():
+            try:
+                self._commit({email: entry})
+                self.committed += 1
+            except REJECTED_ROW_ERRORS as e:
+                logger.error(f"Dropping buffered subscriber {email} the store rejected: {e}")
+                self.dead_letters.append((email, str(e)[:200]))
+                del self.dead_letters[:-DEAD_LETTER_SIZE]
+            except Exception:
+                retry[email] = entry
+        return retry
+
+    async def flush(self) -> int:
+        """Commit everything pending now and return how many subscribers were written."""
+        async with self._flush_lock:
+            if not self._pending:
+                return 0
+            batch, self._pending = self._pending, {}
+            self._in_flight = batch
+            try:
+                return await self._flush_batch(batch)
+            finally:
+                self._in_flight = {}
+                await self._drop_discarded()
+
+    async def _flush_batch(self, batch: Dict[str, Tuple[List[str], Optional[Tuple[str, Optional[int]]]]]) -> int:
+        try:
+            await asyncio.to_thread(self._commit, batch)
+        except Exception as e:
+            self.failures += 1
+            logger.error(f"Error committing {len(batch)} buffered subscribers: {e}")
+            # One bad row must not hold the rest hostage, so fall back to committing rows one at a time
+            committed = self.committed
+            retry = await asyncio.to_thread(self._commit_each, batch)
+            if retry:
+                # Put them back without overwriting anything submitted while the batch was in flight
+                retry = {email: entry for email, entry in retry.items() if email not in self._discarded}
+                self._pending = {**retry, **self._pending}
+                raise
+            return self.committed - committed
+        self.commits += 1
+        self.committed += len(batch)
+        logger.debug(f"Committed {len(batch)} buffered subscribers in {self.last_commit_ms}ms")
+        return len(batch)
+
+    async def _drop_discarded(self):
+        """Delete rows discarded while their batch was in flight, which that batch may just have written."""
+        discarded, self._discarded = self._discarded, set()
+        for email in discarded:
+            if email not in self._pending:
+                await asyncio.to_thread(self.store.pop, email, None)
+
+    async def _wait(self, timeout: Optional[float]):
+        # asyncio.wait rather than wait_for, which can swallow a cancellation racing the wakeup
+        waiter = asyncio.ensure_future(self._wakeup.wait())
+        try:
+            await asyncio.wait({waiter}, timeout=timeout)
+        finally:
+            waiter.cancel()
+
+    async def run(self):
+        """Group-commit pending writes until ``close`` is called."""
+        while not self._closing:
+            # Sleep until the first write arrives, then give later ones an interval to join its batch
+            if not self._pending:
+                await self._wait(None)
+                self._wakeup.clear()
+            if not self._closing and len(self._pending) < self.max_batch:
+                await self._wait(self.interval)
+            self._wakeup.clear()
+            try:
+                await self.flush()
+            except Exception:
+                await asyncio.sleep(SUBSCRIBE_RETRY_DELAY)
+
+    async def close(self):
+        """Stop the background committer once it has written whatever is still pending."""
+        if self._task is not None and not self._task.done():
+            self._closing = True
+            self._wakeup.set()
+            await self._task
+        self._task = None
+        self._closing = False
+        try:
+            await self.flush()
+        except Exception:
+            # Already logged; shutdown carries on so the caller can still release its other resources
+            logger.error(f"{len(self._pending)} buffered subscribers could not be committed before closing")
+
+    def stats(self) -> Dict[str, float]:
+        """Report buffer depth and commit counters for health checks."""
+        return {
+            'pending': len(self._pending),
+            'commits': self.commits,
+            'committed': self.committed,
+            'failures': self.failures,
+            'dead_letters': len(self.dead_letters),
+            'last_commit_ms': self.last_commit_ms
+        }